@@ -0,0 +1,439 @@
+"""
+Benchmarks of the prover building blocks.
+Run `python bench.py` for all of them, or `python bench.py <name> ...` for some of them.
+"""
+
+import random
+import sys
+from timeit import timeit
+
+import numpy as np
+
+from tools.field import P, FieldElement, FieldVector
+
+random.seed(0)
+
+
+def best_time(f, repeat=3):
+    """
+    Returns the best time of a few runs of f, in milliseconds.
+    """
+    number = 1
+    while timeit(f, number=number) < 0.05 and number < 1000:
+        number *= 2
+    return 1000 * min(timeit(f, number=number) for _ in range(repeat)) / number
+
+
+def print_table(header, rows):
+    widths = [max(len(str(x)) for x in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print("  ".join(str(x).rjust(width) for x, width in zip(row, widths)))
+    print()
+
+
+def bench_mul():
+    """
+    Times each polynomial multiplication algorithm on two operands of n coefficients, to locate
+    the crossover points used by Polynomial.__mul__. The operands are lists for the schoolbook and
+    Karatsuba algorithms, and uint64 arrays for the NTT, as in mul_coefficients.
+    """
+    from tools.polynomial import mul_karatsuba, mul_ntt, mul_schoolbook
+
+    algorithms = [
+        ("schoolbook", mul_schoolbook),
+        ("karatsuba", mul_karatsuba),
+        ("ntt", mul_ntt),
+    ]
+    rows = []
+    sizes = [8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 128, 256, 512, 1024]
+    for n in sizes:
+        pol1 = [random.randrange(P) for _ in range(n)]
+        pol2 = [random.randrange(P) for _ in range(n)]
+        arrays = np.array(pol1, dtype=np.uint64), np.array(pol2, dtype=np.uint64)
+        times = [
+            best_time(lambda: f(*(arrays if name == "ntt" else (pol1, pol2))))
+            for name, f in algorithms
+        ]
+        fastest = algorithms[times.index(min(times))][0]
+        rows.append([n] + [f"{t:.3f}" for t in times] + [fastest])
+    print("polynomial multiplication (ms)")
+    print_table(["n"] + [name for name, _ in algorithms] + ["fastest"], rows)
+
+
+def bench_eval():
+    """
+    Times the evaluation of a polynomial of degree n - 1 at n arbitrary points, with a vectorized
+    Horner pass and with a remainder tree, to locate SUBPRODUCT_TREE_THRESHOLD. The NTT used for
+    cosets is shown for reference.
+    """
+    from tools.domain import Domain
+    from tools.polynomial import eval_coset, eval_horner_many, eval_remainder_tree
+
+    rows = []
+    for n in [256, 1024, 4096, 16384, 2**15, 2**16, 2**17]:
+        pol = np.array([random.randrange(P) for _ in range(n)], dtype=np.uint64)
+        points = [random.randrange(P) for _ in range(n)]
+        points_array = np.array(points, dtype=np.uint64)
+        domain = Domain.get(n, 5)
+        times = [
+            best_time(lambda: eval_horner_many(pol, points_array), repeat=1),
+            best_time(lambda: eval_remainder_tree(pol, points), repeat=1),
+            best_time(lambda: eval_coset(pol, domain.offset, domain.generator, n)),
+        ]
+        fastest = "horner" if times[0] < times[1] else "remainder tree"
+        rows.append([n] + [f"{t:.3f}" for t in times] + [fastest])
+    print("multi-point evaluation (ms)")
+    print_table(
+        ["n", "horner", "remainder tree", "coset ntt", "fastest arbitrary"], rows
+    )
+
+
+def bench_memory():
+    """
+    Measures the memory taken by the coefficients of a polynomial of degree n - 1, stored in a
+    Polynomial versus as a list of FieldElements.
+    """
+    import tracemalloc
+
+    from tools.polynomial import Polynomial
+
+    rows = []
+    for n in [1024, 2**16]:
+        values = [random.randrange(1, P) for _ in range(n)]
+        tracemalloc.start()
+        elements = [FieldElement(v) for v in values]
+        boxed = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        poly = Polynomial(values)
+        compact = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del elements, poly
+        rows.append([n, boxed // n, compact // n, f"{boxed / compact:.1f}x"])
+    print("polynomial memory (bytes per coefficient)")
+    print_table(["n", "FieldElement list", "Polynomial", "ratio"], rows)
+
+
+def bench_fri():
+    """
+    Times the FRI commitment of the evaluations of a random polynomial of degree n / 8 over a
+    domain of n points, for each folding factor and remainder degree, along with its number of
+    folds and the number of layer values a query opens.
+    """
+    from tools.channel import Channel
+    from tools.domain import Domain
+    from tools.fri import fri_commit
+    from tools.ntt import lde
+
+    rows = []
+    for n in [2**12, 2**14, 2**16]:
+        coefficients = [random.randrange(P) for _ in range(n // 8)]
+        evaluations = lde(coefficients, 5, 8)
+        domain = Domain.get(n, 5)
+        for k in [2, 4, 8, 16]:
+            for remainder_degree in [0, 31]:
+                commit = lambda: fri_commit(
+                    domain, evaluations, None, Channel(), n // 8, k, remainder_degree
+                )
+                layers = len(commit()[1])
+                # a query opens a whole coset in every layer but the last one
+                opened = sum(
+                    min(k, size) for size in [n // k**i for i in range(layers - 1)]
+                )
+                time = best_time(commit, repeat=1)
+                rows.append([n, k, remainder_degree, layers - 1, opened, f"{time:.3f}"])
+    print("FRI commitment per folding factor and remainder degree")
+    print_table(
+        ["n", "k", "remainder degree", "folds", "values per query", "time (ms)"], rows
+    )
+
+
+def bench_queries():
+    """
+    Times the verification of a FRI proof over 2**14 points for an increasing number of queries,
+    checked one by one, all together, and all together by a pool of 4 processes.
+    """
+    from tools.channel import Channel
+    from tools.domain import Domain
+    from tools.fri import fri_commit, verify_queries, verify_query
+    from tools.merkle import MerkleTree
+    from tools.ntt import lde
+
+    n = 2**14
+    evaluations = lde([random.randrange(P) for _ in range(n // 8)], 5, 8)
+    domain = Domain.get(n, 5)
+    merkle = MerkleTree(evaluations)
+    proof = fri_commit(domain, evaluations, merkle, Channel(), n // 8)
+    rows = []
+    for count in [1, 4, 16, 64, 256]:
+        query_ids = [random.randrange(n) for _ in range(count)]
+        one_by_one = lambda: all(verify_query(i, *proof, n // 8) for i in query_ids)
+        batched = lambda: verify_queries(query_ids, *proof, n // 8)
+        pooled = lambda: verify_queries(query_ids, *proof, n // 8, processes=4)
+        times = [best_time(f, repeat=1) for f in [one_by_one, batched, pooled]]
+        rows.append([count] + [f"{time:.1f}" for time in times])
+    print(f"FRI verification time (ms) over {n} points")
+    print_table(["queries", "one by one", "batched", "4 processes"], rows)
+
+
+def bench_grinding():
+    """
+    Reports the number of FRI queries reaching 80 bits of security for each number of grinding
+    bits and blowup factor, with the time of the nonce search on 1 and 4 processes, averaged over
+    a few channel states.
+    """
+    from tools.channel import find_nonce
+    from tools.fri import num_queries
+
+    states = [f"{random.getrandbits(256):064x}" for _ in range(4)]
+    rows = []
+    for bits in [0, 8, 12, 16, 20]:
+        queries = [num_queries(80, blowup, bits) for blowup in [4, 8, 16]]
+        times = [
+            best_time(
+                lambda: [find_nonce(s, bits, processes) for s in states], repeat=1
+            )
+            / len(states)
+            for processes in [None, 4]
+        ]
+        rows.append([bits] + queries + [f"{time:.1f}" for time in times])
+    print("queries at 80 bits of security and grinding time")
+    print_table(
+        [
+            "bits",
+            "blowup 4",
+            "blowup 8",
+            "blowup 16",
+            "1 process (ms)",
+            "4 processes (ms)",
+        ],
+        rows,
+    )
+
+
+def bench_channel():
+    """
+    Times a transcript of 1000 Merkle roots, 1000 lists of 16 field elements and 1000 random
+    draws on the string and binary channels.
+    """
+    from tools.channel import BinaryChannel, Channel
+
+    roots = [f"{random.getrandbits(256):064x}" for _ in range(1000)]
+    values = [
+        [FieldElement(random.randrange(P)) for _ in range(16)] for _ in range(1000)
+    ]
+
+    def transcript(channel_class):
+        channel = channel_class()
+        for root, vals in zip(roots, values):
+            channel.send_root(root)
+            channel.send_field_elements(vals)
+            channel.receive_random_int(0, P - 1)
+
+    rows = [
+        [channel_class.__name__, f"{best_time(lambda: transcript(channel_class)):.1f}"]
+        for channel_class in [Channel, BinaryChannel]
+    ]
+    print("channel transcript of 3000 messages")
+    print_table(["channel", "time (ms)"], rows)
+
+
+def bench_merkle():
+    """
+    Times the Merkle tree of n random field elements, with binary digests and in the hex
+    compatible mode, along with the memory taken by the tree.
+    """
+    import tracemalloc
+
+    from tools.merkle import MerkleTree
+
+    rows = []
+    for n in [2**12, 2**16, 2**20]:
+        data = FieldVector([random.randrange(P) for _ in range(n)])
+        for compatible in [False, True]:
+            tracemalloc.start()
+            tree = MerkleTree(data, compatible)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del tree
+            time = best_time(lambda: MerkleTree(data, compatible), repeat=1)
+            mode = "hex" if compatible else "binary"
+            rows.append([n, mode, f"{time:.0f}", f"{memory / 2**20:.1f}"])
+    print("Merkle tree build")
+    print_table(["n", "mode", "time (ms)", "memory (MB)"], rows)
+
+
+def bench_commitment():
+    """
+    Compares committing to 19 columns of 2**14 random field elements with one Merkle tree per
+    column and with a single tree over the rows: build time, then authentication path bytes and
+    verification time for one query.
+    """
+    from tools.merkle import MerkleTree, verify_decommitment
+
+    n, width = 2**14, 19
+    columns = np.array([[random.randrange(P) for _ in range(n)] for _ in range(width)])
+    columns = columns.astype(np.uint64)
+    query_id = random.randrange(n)
+
+    def commit_columns():
+        return [MerkleTree(FieldVector._wrap(column)) for column in columns]
+
+    def commit_rows():
+        return [MerkleTree(columns.T)]
+
+    rows = []
+    for name, commit in [("columns", commit_columns), ("rows", commit_rows)]:
+        build = best_time(commit, repeat=1)
+        trees = commit()
+        if len(trees) == 1:
+            leaves = [tuple(FieldVector._wrap(columns[:, query_id]))]
+        else:
+            leaves = [FieldElement(int(column[query_id])) for column in columns]
+        paths = [tree.get_authentication_path(query_id) for tree in trees]
+        size = sum(len(digest) for path in paths for digest in path)
+        verify = best_time(
+            lambda: all(
+                verify_decommitment(query_id, leaf, path, tree.root)
+                for tree, leaf, path in zip(trees, leaves, paths)
+            )
+        )
+        rows.append([name, len(trees), f"{build:.0f}", size, f"{verify * 1000:.0f}"])
+    print(f"commitment of {width} columns of {n} values")
+    print_table(["leaves", "trees", "build (ms)", "path bytes", "verify (us)"], rows)
+
+
+def bench_multiproof():
+    """
+    Compares authenticating q random leaves of a Merkle tree of 2**14 leaves with q single paths
+    and with one multiproof: proof bytes and verification time.
+    """
+    from tools.merkle import MerkleTree, verify_decommitment, verify_multiproof
+
+    n = 2**14
+    data = FieldVector([random.randrange(P) for _ in range(n)])
+    tree = MerkleTree(data)
+    rows = []
+    for q in [1, 16, 64, 256]:
+        leaves = {i: data[i] for i in random.sample(range(n), q)}
+        paths = {i: tree.get_authentication_path(i) for i in leaves}
+        multiproof = tree.get_multiproof(leaves)
+        single_bytes = sum(len(digest) for path in paths.values() for digest in path)
+        multi_bytes = sum(len(digest) for digests in multiproof for digest in digests)
+        single_time = best_time(
+            lambda: all(
+                verify_decommitment(i, leaf, paths[i], tree.root)
+                for i, leaf in leaves.items()
+            )
+        )
+        multi_time = best_time(lambda: verify_multiproof(tree.root, leaves, multiproof))
+        rows.append(
+            [q, single_bytes, multi_bytes, f"{single_time:.2f}", f"{multi_time:.2f}"]
+        )
+    print(f"authentication of q leaves out of {n}")
+    print_table(
+        ["q", "paths (bytes)", "multiproof (bytes)", "paths (ms)", "multiproof (ms)"],
+        rows,
+    )
+
+
+def bench_hashers():
+    """
+    Times the Merkle tree of n random field elements for each hasher, and for Pedersen hashes
+    computed one by one with pedersen_hash on the smallest size.
+    """
+    from tools.hashers import HASHERS, Hasher
+    from tools.merkle import MerkleTree
+    from tools.pedersen import pedersen_hash
+
+    class NaivePedersenHasher(Hasher):
+        name = "pedersen, one by one"
+        digest_size = 4
+
+        def hash_leaf(self, leaf):
+            return bytes(leaf)
+
+        def hash_node(self, left, right):
+            a, b = int.from_bytes(left, "big"), int.from_bytes(right, "big")
+            return pedersen_hash(FieldElement(a), FieldElement(b)).val.to_bytes(
+                4, "big"
+            )
+
+    rows = []
+    for n in [2**10, 2**14, 2**16]:
+        # pedersen_hash fails on zero
+        data = FieldVector([random.randrange(1, P) for _ in range(n)])
+        hashers = list(HASHERS.values())
+        if n == 2**10:
+            hashers.append(NaivePedersenHasher())
+        for hasher in hashers:
+            time = best_time(lambda: MerkleTree(data, hasher=hasher), repeat=1)
+            rows.append([n, hasher.name, f"{time:.0f}"])
+    print("Merkle tree build per hasher")
+    print_table(["n", "hasher", "time (ms)"], rows)
+
+
+STREAMING_BUILD = """
+import resource, sys
+import numpy as np
+from tools.field import FieldVector
+from tools.merkle import MerkleTree, StreamingMerkleTree
+path, mode = sys.argv[1], sys.argv[2]
+if mode == "streaming":
+    StreamingMerkleTree(path, path + ".nodes").close()
+else:
+    MerkleTree(FieldVector._wrap(np.fromfile(path, dtype=">u4").astype(np.uint64)))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_streaming():
+    """
+    Measures the peak resident memory of a process building the Merkle tree of a file of n random
+    field elements, in memory and streamed into a node file.
+    """
+    import os
+    import subprocess
+    import tempfile
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "leaves")
+        for n in [2**16, 2**19, 2**21]:
+            with open(path, "wb") as f:
+                for _ in range(0, n, 2**16):
+                    chunk = np.random.randint(0, P, 2**16, dtype=np.uint64)
+                    f.write(chunk.astype(">u4").tobytes())
+            peaks = []
+            for mode in ["memory", "streaming"]:
+                output = subprocess.run(
+                    [sys.executable, "-c", STREAMING_BUILD, path, mode],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                ).stdout
+                peaks.append(f"{int(output) / 1024:.0f}")
+            rows.append([n] + peaks)
+    print("peak resident memory (MB) of a Merkle tree build")
+    print_table(["n", "in memory", "streaming"], rows)
+
+
+BENCHMARKS = {
+    "mul": bench_mul,
+    "eval": bench_eval,
+    "memory": bench_memory,
+    "fri": bench_fri,
+    "queries": bench_queries,
+    "grinding": bench_grinding,
+    "channel": bench_channel,
+    "merkle": bench_merkle,
+    "commitment": bench_commitment,
+    "multiproof": bench_multiproof,
+    "hashers": bench_hashers,
+    "streaming": bench_streaming,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
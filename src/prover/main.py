@@ -1,38 +1,57 @@
-from tools.field import P, FieldElement
-from tools.polynomial import X, interpolate_poly, Polynomial
+from tools.field import P, FieldElement, FieldVector
+from tools.polynomial import (
+    X,
+    interpolate_many,
+    interpolate_poly,
+    Polynomial,
+    VanishingPolynomial,
+)
+from tools.ntt import lde
+from tools.linear_combination import LinearCombination
+from tools.domain import Domain
 from tools.curve import curve, G, O
-from tools.merkle import MerkleTree
-from tools.channel import Channel
+from tools.hashers import HASHERS
+from tools.merkle import MerkleTree, verify_multiproof
+from tools.channel import BinaryChannel, Channel, is_valid_nonce
+from tools import fri
 import random
-
-# G = (72051298 : 2007892845 : 1)
-# We need to prove we know a such that k * G is part of a list
-# ∃ k, k*G ∈ list
-
-# we use a seed to keep this example deterministic
-random.seed(0)
-
-# 1) we generate a random felt of the curve size, 0 is forbidden
-k = random.randrange(1, 149717)
-
-# 2) compute the trace
-# we initialize the registers to 0
-# [id : 0, bit : 1, add[coeff, x, y, inf] : 2, to_double[x, y, inf] : 6,
-# doubled[coeff, x, y, inf] : 9, r1[x, y, z] : 13, r0[x, y, z] : 16 ]
-
-registers = []
-# because we have 19 registers
-for _ in range(19):
-    # because there are 19 steps
-    registers.append(32 * [FieldElement(0)])
-
-# we fill registers at t=0
-G.write(registers, 0, 13)
-O.write(registers, 0, 16)
-
-# and we add our montgmery computation to the registers,
-# 18 should be enough but we put 31 to fill the arrays
-curve.trace_mul(registers, k, G, O, 31)
+import numpy as np
+
+# The composition polynomial is either built in coefficient form from the interpolated trace
+# ("polynomial"), or evaluated pointwise over the evaluation domain from the extended trace
+# ("pointwise"). Both give the same evaluations.
+CONSTRAINTS_MODE = "pointwise"
+# FRI either folds the composition polynomial and evaluates each folded polynomial over the next
+# domain ("polynomial"), or folds the layer evaluations directly ("evaluations"). Both give the
+# same layers.
+FRI_MODE = "evaluations"
+# Number of points of a FRI layer folded into one point of the next layer, a power of two. The
+# polynomial FRI mode only folds by 2.
+FOLDING_FACTOR = 2
+# FRI stops folding once the layer polynomial is of at most this degree, and sends its
+# coefficients instead of committing to the last layers.
+REMAINDER_DEGREE = 0
+# The channel either hashes binary data and records typed proof entries ("binary"), or hashes
+# hex strings and records formatted strings ("string"), like the original channel. No mode
+# reproduces the original proof, whose random draws and FRI layers were made differently.
+TRANSCRIPT_MODE = "binary"
+# The string channel goes with the hex Merkle trees, whose roots and paths are hex strings.
+HEX_MERKLE = TRANSCRIPT_MODE == "string"
+# The extended trace is committed either with one Merkle tree whose leaf i holds the whole row i
+# ("rows"), or with one tree per column ("columns"). With
+# FRI_COSET_LEAVES, each FRI layer tree has one leaf per coset folded together, instead of one
+# per value. A query then opens one leaf of the trace and one leaf per FRI layer.
+COMMITMENT_MODE = "rows"
+FRI_COSET_LEAVES = True
+# The hash function of the binary Merkle trees: "sha256", "blake2s" or "pedersen".
+MERKLE_HASHER = "sha256"
+# Each query brings about log2(blowup) bits of security, the rest comes from GRINDING_BITS bits
+# of proof of work, searched by a pool of GRINDING_PROCESSES processes. The queries can be checked
+# by a pool of VERIFY_PROCESSES processes.
+SECURITY_BITS = 64
+GRINDING_BITS = 16
+GRINDING_PROCESSES = None
+VERIFY_PROCESSES = None
 
 # 3) we find a small subgroup of F which can contain the trace
 # P-1 = 3 * 2**30
@@ -40,57 +59,50 @@ curve.trace_mul(registers, k, G, O, 31)
 g = FieldElement.generator() ** (2**25 * 3)
 assert g.is_order(32)
 # we can then find the elements of this subgroup
-subgroup = [g**i for i in range(32)]
-
-# 4) we interpolate the traces to find the polynomials
-interpolated = []
-for i, trace in enumerate(registers):
-    f = interpolate_poly(subgroup, trace)
-    interpolated.append(f)
-
-# 5) we extend the trace polynomial by evaluating it over a larger domain
+trace_domain = Domain.get(32)
+assert trace_domain.generator == g
+subgroup = trace_domain.elements
 
 # 5) A - we find a 8 = 2^3 times bigger subgroup of F which can contain the trace
 
+blowup = 8
 h = FieldElement.generator() ** (2**22 * 3)
-assert h.is_order(8 * 32)
-H = [h**i for i in range(256)]
-# 5) B - we find a coset from this subgroup by multiplying by the F generator
-eval_domain = [g * x for x in H]
-
-# 5) C - we evaluate the trace polynomials
-
-evaluated = []
-merkled = []
-# We create a channel
-channel = Channel()
-for f in interpolated:
-    evaluation = [f(d) for d in eval_domain]
-    evaluated.append(evaluation)
-    merkle = MerkleTree(evaluation)
-    merkled.append(merkle)
-    channel.send(merkle.root)
-
-resultat = (registers[16][31], registers[17][31], registers[18][31])
-
-
-def load_constraints(interpolated):
+assert h.is_order(blowup * 32)
+H = Domain.get(256)
+assert H.generator == h
+# 5) B - we find a coset from this subgroup by multiplying by the F generator,
+# it doesn't intersect the subgroup of the trace, so the constraints can be divided pointwise
+w = FieldElement.generator()
+eval_domain = Domain.get(256, w)
+
+# The trace polynomials are of degree at most 31. The heaviest constraints, the curve additions
+# 2) and 3), multiply four of them (λ * λ * (1 - p.z) * (1 - q.z)) before dividing by a
+# vanishing polynomial of degree 31, which leaves a degree of at most 4 * 31 - 31 = 93 for any
+# witness, so the composition polynomial is of degree below the power of two 128. FRI checks this
+# a-priori bound, from which the number of folds is derived, so a trace breaking the constraints
+# makes the proof invalid.
+DEGREE_BOUND = 128
+
+
+def trace_constraints(columns, next_row, divisors):
+    """
+    Returns the constraints of the trace, written once for both constraint modes: columns are the
+    trace polynomials and next_row(f) is f(X * g), or columns are their evaluations over the
+    evaluation domain and next_row rotates them. divisors holds four functions dividing a
+    constraint by the polynomial vanishing on all the rows, all the rows but the last one, all the
+    rows but the first one, and the first row only.
+    """
     constraints = []
-
-    all_roots = X**32 - 1
+    all_roots, all_roots_but_last, all_roots_but_first, first_root_only = divisors
 
     # id register
-    id_f = interpolated[0]
-    all_roots_but_last = all_roots / (X - subgroup[-1])
-    all_roots_but_first = all_roots / (X - subgroup[0])
-    constraints.append(
-        (id_f(X * g) - id_f(X) - FieldElement.one()) / all_roots_but_last
-    )
+    id_f = columns[0]
+    constraints.append(all_roots_but_last(next_row(id_f) - id_f - FieldElement.one()))
 
     # bit = 0 | 1
-    bit = interpolated[1]
+    bit = columns[1]
     constraints.append(
-        ((bit(X) - FieldElement.one()) * (bit(X) - FieldElement.zero())) / all_roots
+        all_roots((bit - FieldElement.one()) * (bit - FieldElement.zero()))
     )
 
     # elliptic curve add, p = R1, q = R0
@@ -99,64 +111,67 @@ def load_constraints(interpolated):
     # 3) y = λ * (p.x - x) - p.y
     # 4) z = p.z * q.z
 
-    lambda_f = interpolated[2]
-    x = interpolated[3]
-    y = interpolated[4]
-    z = interpolated[5]
-    p_x = interpolated[13]
-    p_y = interpolated[14]
-    p_z = interpolated[15]
-    q_x = interpolated[16]
-    q_y = interpolated[17]
-    q_z = interpolated[18]
+    lambda_f = columns[2]
+    x = columns[3]
+    y = columns[4]
+    z = columns[5]
+    p_x = columns[13]
+    p_y = columns[14]
+    p_z = columns[15]
+    q_x = columns[16]
+    q_y = columns[17]
+    q_z = columns[18]
+    next_lambda = next_row(lambda_f)
 
     # 1)
-    constraints.append((lambda_f(X * g) * (q_x - p_x) - q_y + p_y) / all_roots_but_last)
+    constraints.append(all_roots_but_last(next_lambda * (q_x - p_x) - q_y + p_y))
 
     # 2)
     constraints.append(
-        (
-            x(X * g)
+        all_roots_but_last(
+            next_row(x)
             - (
-                (lambda_f(X * g) * lambda_f(X * g) - p_x - q_x) * (1 - p_z) * (1 - q_z)
+                (next_lambda * next_lambda - p_x - q_x) * (1 - p_z) * (1 - q_z)
                 + p_z * q_x
                 + q_z * p_x
             )
         )
-        / all_roots_but_last
     )
 
     # 3)
     constraints.append(
-        (
-            y(X * g)
+        all_roots_but_last(
+            next_row(y)
             - (
-                (lambda_f(X * g) * (p_x - x(X * g)) - p_y) * (1 - p_z) * (1 - q_z)
+                (next_lambda * (p_x - next_row(x)) - p_y) * (1 - p_z) * (1 - q_z)
                 + p_z * q_y
                 + q_z * p_y
             )
         )
-        / all_roots_but_last
     )
 
     # 4)
-    constraints.append((z(X * g) - p_z(X) * q_z(X)) / all_roots_but_last)
+    constraints.append(all_roots_but_last(next_row(z) - p_z * q_z))
 
     # to_double: P if bit = 1, Q if bit = 0
-    to_double_x = interpolated[6]
-    to_double_y = interpolated[7]
-    to_double_z = interpolated[8]
+    to_double_x = columns[6]
+    to_double_y = columns[7]
+    to_double_z = columns[8]
+    next_bit = next_row(bit)
     constraints.append(
-        (to_double_x(X * g) - bit(X * g) * p_x - (1 - bit(X * g)) * q_x)
-        / all_roots_but_last
+        all_roots_but_last(
+            next_row(to_double_x) - next_bit * p_x - (1 - next_bit) * q_x
+        )
     )
     constraints.append(
-        (to_double_y(X * g) - bit(X * g) * p_y - (1 - bit(X * g)) * q_y)
-        / all_roots_but_last
+        all_roots_but_last(
+            next_row(to_double_y) - next_bit * p_y - (1 - next_bit) * q_y
+        )
     )
     constraints.append(
-        (to_double_z(X * g) - bit(X * g) * p_z - (1 - bit(X * g)) * q_z)
-        / all_roots_but_last
+        all_roots_but_last(
+            next_row(to_double_z) - next_bit * p_z - (1 - next_bit) * q_z
+        )
     )
 
     # elliptic curve double, Q if bit = 0, else P
@@ -166,88 +181,148 @@ def load_constraints(interpolated):
     # 3) y - λ * (_X - x) + _Y = 0
     # 4) z - _Z = 0
 
-    doubled_lambda = interpolated[9]
-    doubled_x = interpolated[10]
-    doubled_y = interpolated[11]
-    doubled_z = interpolated[12]
+    doubled_lambda = columns[9]
+    doubled_x = columns[10]
+    doubled_y = columns[11]
+    doubled_z = columns[12]
 
     # 1)
     constraints.append(
-        (
+        all_roots_but_first(
             doubled_lambda * FieldElement(2) * to_double_y
             - (FieldElement(3) * to_double_x**2 + curve.alpha)
         )
-        / all_roots_but_first
     )
 
     # 2)
     constraints.append(
-        (doubled_x - doubled_lambda * doubled_lambda + FieldElement(2) * to_double_x)
-        * (1 - to_double_z)
-        / all_roots_but_first
+        all_roots_but_first(
+            (
+                doubled_x
+                - doubled_lambda * doubled_lambda
+                + FieldElement(2) * to_double_x
+            )
+            * (1 - to_double_z)
+        )
     )
 
     # 3)
     constraints.append(
-        (doubled_y - doubled_lambda * (to_double_x - doubled_x) + to_double_y)
-        * (1 - to_double_z)
-        / all_roots_but_first
+        all_roots_but_first(
+            (doubled_y - doubled_lambda * (to_double_x - doubled_x) + to_double_y)
+            * (1 - to_double_z)
+        )
     )
 
     # 4)
     constraints.append(
-        (doubled_z - ((FieldElement(1) - bit) * q_z + bit * p_z)) / all_roots_but_first
+        all_roots_but_first(doubled_z - ((FieldElement(1) - bit) * q_z + bit * p_z))
     )
 
     # r1
-    r1_x = interpolated[13]
-    r1_y = interpolated[14]
-    r1_z = interpolated[15]
-    constraints.append((r1_x - doubled_x * bit - x * (1 - bit)) / all_roots_but_first)
-    constraints.append((r1_y - doubled_y * bit - y * (1 - bit)) / all_roots_but_first)
-    constraints.append((r1_z - doubled_z * bit - z * (1 - bit)) / all_roots_but_first)
+    r1_x = columns[13]
+    r1_y = columns[14]
+    r1_z = columns[15]
+    constraints.append(all_roots_but_first(r1_x - doubled_x * bit - x * (1 - bit)))
+    constraints.append(all_roots_but_first(r1_y - doubled_y * bit - y * (1 - bit)))
+    constraints.append(all_roots_but_first(r1_z - doubled_z * bit - z * (1 - bit)))
 
     # r0
-    r0_x = interpolated[16]
-    r0_y = interpolated[17]
-    r0_z = interpolated[18]
-    constraints.append((r0_x - doubled_x * (1 - bit) - x * bit) / all_roots_but_first)
-    constraints.append((r0_y - doubled_y * (1 - bit) - y * bit) / all_roots_but_first)
-    constraints.append((r0_z - doubled_z * (1 - bit) - z * bit) / all_roots_but_first)
+    r0_x = columns[16]
+    r0_y = columns[17]
+    r0_z = columns[18]
+    constraints.append(all_roots_but_first(r0_x - doubled_x * (1 - bit) - x * bit))
+    constraints.append(all_roots_but_first(r0_y - doubled_y * (1 - bit) - y * bit))
+    constraints.append(all_roots_but_first(r0_z - doubled_z * (1 - bit) - z * bit))
 
     # edge constraints:
 
-    first_root_only = X - g**0
-
     # G
-    constraints.append((r1_x - G.x) / first_root_only)
-    constraints.append((r1_y - G.y) / first_root_only)
-    constraints.append((r1_z - G.infinity) / first_root_only)
+    constraints.append(first_root_only(r1_x - G.x))
+    constraints.append(first_root_only(r1_y - G.y))
+    constraints.append(first_root_only(r1_z - G.infinity))
 
     # O
-    constraints.append((r0_x - O.x) / first_root_only)
-    constraints.append((r0_y - O.y) / first_root_only)
-    constraints.append((r0_z - O.infinity) / first_root_only)
+    constraints.append(first_root_only(r0_x - O.x))
+    constraints.append(first_root_only(r0_y - O.y))
+    constraints.append(first_root_only(r0_z - O.infinity))
 
     return constraints
 
 
-constraints = load_constraints(interpolated)
+def vanishing_polynomials():
+    """
+    Returns the polynomials vanishing on all the rows, all the rows but the last one, all the rows
+    but the first one, and the first row only. The first three are sparse, so that dividing by
+    them takes linear time.
+    """
+    return (
+        VanishingPolynomial(32),
+        VanishingPolynomial(32, [subgroup[-1]]),
+        VanishingPolynomial(32, [subgroup[0]]),
+        X - g**0,
+    )
+
+
+def divide_by(divisor):
+    return lambda constraint: constraint / divisor
+
 
-cp: Polynomial = FieldElement(channel.receive_random_int(0, P - 1)) * constraints[0]
-for i in range(1, len(constraints)):
-    cp += FieldElement(channel.receive_random_int(0, P - 1)) * constraints[i]
+def multiply_by(inverses):
+    return lambda constraint: constraint * inverses
 
-cp_eval = [cp(d) for d in eval_domain]
+
+def load_constraints(interpolated):
+    """
+    Returns the constraints as polynomials, from the trace polynomials.
+    """
+    return trace_constraints(
+        interpolated,
+        lambda f: f(X * g),
+        [divide_by(divisor) for divisor in vanishing_polynomials()],
+    )
+
+
+def next_row(column):
+    """
+    Returns the evaluations of f(g * X) from those of f over the evaluation domain: since
+    g = h**blowup, this is a rotation of the column by blowup indices.
+    """
+    return column.roll(-blowup)
+
+
+def inverse_evaluations(divisor):
+    """
+    Evaluates 1 / divisor over the evaluation domain, which does not meet the trace domain.
+    """
+    if isinstance(divisor, VanishingPolynomial):
+        return divisor.coset_inverse_evaluations(w, len(eval_domain))
+    return divisor.eval_many(eval_domain, as_vector=True).inverse()
+
+
+def evaluate_constraints(columns):
+    """
+    Evaluates the constraints pointwise over the evaluation domain, from the extended trace
+    columns given as FieldVectors: the vanishing polynomials are divided out by multiplying with
+    their inverses over the coset.
+    """
+    return trace_constraints(
+        columns,
+        next_row,
+        [
+            multiply_by(inverse_evaluations(divisor))
+            for divisor in vanishing_polynomials()
+        ],
+    )
 
 
 def next_fri_domain(fri_domain):
-    return [x**2 for x in fri_domain[: len(fri_domain) // 2]]
+    return fri_domain.next_fri_domain()
 
 
 def next_fri_polynomial(poly, beta):
-    odd_coefficients = poly.poly[1::2]
-    even_coefficients = poly.poly[::2]
+    odd_coefficients = poly.coeffs[1::2]
+    even_coefficients = poly.coeffs[::2]
     odd = beta * Polynomial(odd_coefficients)
     even = Polynomial(even_coefficients)
     return odd + even
@@ -256,7 +331,7 @@ def next_fri_polynomial(poly, beta):
 def next_fri_layer(poly, domain, beta):
     next_poly = next_fri_polynomial(poly, beta)
     next_domain = next_fri_domain(domain)
-    next_layer = [next_poly(x) for x in next_domain]
+    next_layer = next_poly.eval_many(next_domain)
     return next_poly, next_domain, next_layer
 
 
@@ -266,7 +341,8 @@ def fri_commit(cp, domain, cp_eval, cp_merkle, channel: Channel):
     fri_layers = [cp_eval]
     fri_merkles = [cp_merkle]
     fri_betas = []
-    while fri_polys[-1].degree() > 0:
+    sizes = fri.layer_sizes(len(domain), DEGREE_BOUND, 2, REMAINDER_DEGREE)
+    for layer_id in range(1, len(sizes)):
         beta = channel.receive_random_int(0, P - 1)
         next_poly, next_domain, next_layer = next_fri_layer(
             fri_polys[-1], fri_domains[-1], beta
@@ -275,54 +351,218 @@ def fri_commit(cp, domain, cp_eval, cp_merkle, channel: Channel):
         fri_domains.append(next_domain)
         fri_layers.append(next_layer)
         fri_betas.append(beta)
-        # fri_merkles.append(MerkleTree(next_layer))
-        # channel.send("fri step root", fri_merkles[-1].root)
+        if layer_id + 1 < len(sizes):
+            fri_merkles.append(
+                fri.commit_layer(
+                    next_layer, 2, HEX_MERKLE, FRI_COSET_LEAVES, cp_merkle.hasher
+                )
+            )
+            channel.send_root(fri_merkles[-1].root)
 
-    # free element of degree 0 poly
-    channel.send("fri step root: " + str(fri_polys[-1].poly[0]))
+    # the last polynomial is sent instead of being committed
+    fri_polys[-1] = fri.remainder_polynomial(
+        fri_polys[-1], fri.remainder_bound(DEGREE_BOUND, sizes) - 1
+    )
+    fri.send_remainder(channel, fri_polys[-1])
     return fri_polys, fri_domains, fri_layers, fri_merkles, fri_betas
 
 
-evaluation_tree = MerkleTree(cp_eval)
-fri_polys, fri_domains, fri_layers, fri_merkles, fri_betas = fri_commit(
-    cp, eval_domain, cp_eval, evaluation_tree, channel
-)
+def verify_trace(trace_merkles, extended, query_ids, coefficients, cp_layer):
+    """
+    Checks the extended trace at the queries against its commitment, and the composition
+    polynomial against the trace. The rows i and i + blowup of every query i are opened, with one
+    multiproof per tree: whole rows with a single tree, or one value per column otherwise. The
+    constraints evaluated on them must then combine into the value of the composition polynomial
+    at i, in cp_layer, the first FRI layer, whose values FRI checks against its commitment.
+    """
+    ids = np.array(sorted(set(query_ids)))
+    # the opened rows, laid out so that the next row of each of the first len(ids) ones is
+    # len(ids) rows further, as over the evaluation domain it is blowup rows further
+    opened = np.concatenate([ids, (ids + blowup) % len(eval_domain)]).tolist()
+    if len(trace_merkles) == 1:
+        openings = [{i: tuple(column[i] for column in extended) for i in opened}]
+    else:
+        openings = [{i: column[i] for i in opened} for column in extended]
+    if not all(
+        verify_multiproof(
+            merkle.root, leaves, merkle.get_multiproof(leaves), merkle.hasher
+        )
+        for merkle, leaves in zip(trace_merkles, openings)
+    ):
+        return False
+    if len(trace_merkles) == 1:
+        columns = [FieldVector(column) for column in zip(*map(openings[0].get, opened))]
+    else:
+        columns = [FieldVector(list(map(leaves.get, opened))) for leaves in openings]
+    points = FieldVector._wrap(eval_domain.vector.vals[opened])
+    constraints = trace_constraints(
+        columns,
+        lambda column: column.roll(-len(ids)),
+        [
+            multiply_by(divisor.eval_many(points, as_vector=True).inverse())
+            for divisor in vanishing_polynomials()
+        ],
+    )
+    combination = LinearCombination(zip(coefficients, constraints)).result()
+    return np.array_equal(combination.vals[: len(ids)], FieldVector(cp_layer).vals[ids])
+
+
+def verify_proof(
+    trace,
+    fri_domains,
+    fri_layers,
+    fri_merkles,
+    fri_betas,
+    remainder,
+    grinding,
+    query_ids,
+):
+    """
+    Checks the proof at the queries: the proof of work, the trace, given as its Merkle trees,
+    extended columns and the coefficients of the composition polynomial, and the FRI layers.
+    """
+    trace_merkles, extended, coefficients = trace
+    grinding_state, nonce = grinding
+    is_valid = (
+        is_valid_nonce(grinding_state, GRINDING_BITS, nonce)
+        and verify_trace(
+            trace_merkles, extended, query_ids, coefficients, fri_layers[0]
+        )
+        and fri.verify_queries(
+            query_ids,
+            fri_domains,
+            fri_layers,
+            fri_merkles,
+            fri_betas,
+            remainder,
+            DEGREE_BOUND,
+            FOLDING_FACTOR,
+            REMAINDER_DEGREE,
+            VERIFY_PROCESSES,
+        )
+    )
+    if is_valid:
+        print("Proof is valid.")
+    else:
+        print("Proof is invalid.")
 
-def fri_check(layer_id, domain_id, fri_domains, fri_layers, fri_merkles, fri_betas):
-    if layer_id == len(fri_layers) - 1:
-        return True
-    domain = fri_domains[layer_id]
-    length = len(domain)
-    sibling_id = (domain_id + length // 2) % length
-    fx = fri_layers[layer_id][domain_id]
-    fsib_x = fri_layers[layer_id][sibling_id]
 
-    # f(x^2) from next f
-    next_domain_id = sibling_id % (length // 2)
+def main():
+    """
+    Proves that we know k such that k * G is the result of the trace, and checks the proof at
+    random queries. Returns the channel, the composition polynomial evaluations and the FRI layers.
+    """
+    # G = (72051298 : 2007892845 : 1)
+    # We need to prove we know a such that k * G is part of a list
+    # ∃ k, k*G ∈ list
+
+    # we use a seed to keep this example deterministic
+    random.seed(0)
+
+    # 1) we generate a random felt of the curve size, 0 is forbidden
+    k = random.randrange(1, 149717)
+
+    # 2) compute the trace
+    # we initialize the registers to 0
+    # [id : 0, bit : 1, add[coeff, x, y, inf] : 2, to_double[x, y, inf] : 6,
+    # doubled[coeff, x, y, inf] : 9, r1[x, y, z] : 13, r0[x, y, z] : 16 ]
+
+    registers = []
+    # because we have 19 registers
+    for _ in range(19):
+        # because there are 19 steps
+        registers.append(32 * [FieldElement(0)])
+
+    # we fill registers at t=0
+    G.write(registers, 0, 13)
+    O.write(registers, 0, 16)
+
+    # and we add our montgmery computation to the registers,
+    # 18 should be enough but we put 31 to fill the arrays
+    curve.trace_mul(registers, k, G, O, 31)
+
+    # 4) we interpolate the traces to find the polynomials
+    # all the columns share the same domain, so they are interpolated together
+    interpolated = interpolate_many(subgroup, registers)
+
+    # 5) we extend the trace polynomial by evaluating it over a larger domain
+
+    # 5) C - we evaluate the trace polynomials
+
+    # all the columns are extended at once, with a forward NTT over the coset
+    extended = lde([f.coeffs for f in interpolated], w, blowup, 32)
+    # We create a channel
+    channel = BinaryChannel() if TRANSCRIPT_MODE == "binary" else Channel()
+    hasher = HASHERS[MERKLE_HASHER]
+    if COMMITMENT_MODE == "rows":
+        trace_rows = np.array([column.vals for column in extended]).T
+        trace_merkles = [MerkleTree(trace_rows, HEX_MERKLE, hasher)]
+    else:
+        trace_merkles = [MerkleTree(column, HEX_MERKLE, hasher) for column in extended]
+    for merkle in trace_merkles:
+        channel.send_root(merkle.root)
 
-    x = domain[domain_id]
-    next_query = fri_layers[layer_id + 1][next_domain_id]
-    beta = fri_betas[layer_id]
+    if CONSTRAINTS_MODE == "polynomial":
+        constraints = load_constraints(interpolated)
 
-    test = (fx + fsib_x) / FieldElement(2) + beta * (fx - fsib_x) / (
-        FieldElement(2) * x
-    )
+        coefficients = channel.receive_random_field_elements(len(constraints))
+        combination = LinearCombination(zip(coefficients, constraints))
+        cp: Polynomial = combination.result()
 
-    if test != next_query:
-        return False
+        cp_eval = cp.eval_many(eval_domain)
+    else:
+        constraints = evaluate_constraints(extended)
 
-    return fri_check(layer_id + 1, next_domain_id, fri_domains, fri_layers, fri_merkles, fri_betas)
+        coefficients = channel.receive_random_field_elements(len(constraints))
+        combination = LinearCombination(zip(coefficients, constraints))
 
+        cp_eval = combination.result().to_elements()
 
-def verify_proof(fri_domains, fri_layers, fri_merkles, fri_betas, random_id):
-    is_valid = fri_check(0, random_id, fri_domains, fri_layers, fri_merkles, fri_betas)
-    if is_valid:
-        print("Proof is valid.")
+    evaluation_tree = fri.commit_layer(
+        cp_eval, FOLDING_FACTOR, HEX_MERKLE, FRI_COSET_LEAVES, hasher
+    )
+    if FRI_MODE == "polynomial":
+        assert FOLDING_FACTOR == 2, "The polynomial FRI mode only folds by 2."
+        if CONSTRAINTS_MODE == "pointwise":
+            # the composition polynomial is interpolated back from the coset
+            cp = interpolate_poly(eval_domain.elements, cp_eval)
+        fri_polys, fri_domains, fri_layers, fri_merkles, fri_betas = fri_commit(
+            cp, eval_domain, cp_eval, evaluation_tree, channel
+        )
+        remainder = fri_polys[-1]
     else:
-        print("Proof is invalid.")
+        fri_domains, fri_layers, fri_merkles, fri_betas, remainder = fri.fri_commit(
+            eval_domain,
+            cp_eval,
+            evaluation_tree,
+            channel,
+            DEGREE_BOUND,
+            FOLDING_FACTOR,
+            REMAINDER_DEGREE,
+        )
+
+    # Grind before drawing the queries
+    grinding_state = channel.state
+    nonce = channel.grind(GRINDING_BITS, GRINDING_PROCESSES)
+
+    # Call the verify_proof function on the random queries
+    length = len(eval_domain)
+    num_queries = fri.num_queries(SECURITY_BITS, blowup, GRINDING_BITS)
+    query_ids = channel.receive_random_indices(num_queries, length)
+    verify_proof(
+        (trace_merkles, extended, coefficients),
+        fri_domains,
+        fri_layers,
+        fri_merkles,
+        fri_betas,
+        remainder,
+        (grinding_state, nonce),
+        query_ids,
+    )
+    return channel, cp_eval, fri_layers
 
 
-# Call the verify_proof function
-length = len(eval_domain)
-random_id = channel.receive_random_int(0, P - 1) % length
-verify_proof(fri_domains, fri_layers, fri_merkles, fri_betas, random_id)
\ No newline at end of file
+# The proof is only made when main.py is run, not when it is imported, for instance by the
+# processes of a pool started with the spawn method.
+if __name__ == "__main__":
+    main()
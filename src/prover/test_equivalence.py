@@ -0,0 +1,160 @@
+"""
+Checks that the fast code paths compute the same results as the simple algorithms they replace.
+Run with `python -m pytest` from src/prover.
+"""
+
+import random
+from hashlib import sha256
+from math import ceil, log2
+
+import numpy as np
+import pytest
+
+from tools.field import FieldElement, P
+from tools.hashers import PEDERSEN, SHA256
+from tools.domain import Domain
+from tools.merkle import MerkleTree, StreamingMerkleTree, verify_decommitment
+from tools.ntt import coset_parameters
+from tools.pedersen import pedersen_hash, pedersen_hash_many
+from tools.polynomial import (
+    mul_coefficients,
+    mul_karatsuba,
+    mul_ntt,
+    mul_schoolbook,
+    Polynomial,
+    VanishingPolynomial,
+)
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    # as in main.py, so that a failure can be reproduced
+    random.seed(0)
+
+
+def random_coefficients(n):
+    return [random.randrange(P) for _ in range(n)]
+
+
+@pytest.mark.parametrize(
+    "n, m",
+    [(1, 1), (3, 0), (17, 5), (33, 33), (40, 100), (64, 64), (150, 97), (300, 1)],
+)
+def test_multiplication_matches_schoolbook(n, m):
+    pol1, pol2 = random_coefficients(n), random_coefficients(m)
+    expected = mul_schoolbook(pol1, pol2)
+    assert mul_karatsuba(pol1, pol2) == expected
+    if n and m:
+        assert mul_ntt(pol1, pol2).tolist() == expected
+    arrays = np.array(pol1, dtype=np.uint64), np.array(pol2, dtype=np.uint64)
+    assert mul_coefficients(*arrays).tolist() == expected
+
+
+def test_pedersen_hash_many_matches_pedersen_hash():
+    a = np.array([1, 2, P - 1] + random_coefficients(5), dtype=np.uint64)
+    b = np.array([1, P - 1, 7] + random_coefficients(5), dtype=np.uint64)
+    a[a == 0], b[b == 0] = 1, 1
+    expected = [
+        pedersen_hash(FieldElement(int(x)), FieldElement(int(y))).val
+        for x, y in zip(a, b)
+    ]
+    assert pedersen_hash_many(a, b).tolist() == expected
+
+
+@pytest.mark.parametrize("n", [256, 1024, 2048])
+def test_eval_many_on_int_points_matches_eval(n):
+    pol = Polynomial(random_coefficients(100))
+    coset = [x.val for x in Domain.get(n, 5).elements]
+    assert coset_parameters(coset) is not None
+    for points in [coset, list(range(1, n + 1)), random_coefficients(n)]:
+        assert pol.eval_many(points) == [pol.eval(x) for x in points]
+
+
+@pytest.mark.parametrize("excluded", [[], [0], [0, 31], [5, 9, 17]])
+def test_vanishing_polynomial_eval_many_matches_dense(excluded):
+    subgroup = Domain.get(32).elements
+    vanishing = VanishingPolynomial(32, [subgroup[i] for i in excluded])
+    dense = Polynomial(vanishing.coeffs)
+    # random points, points of the subgroup including the excluded roots, and a coset
+    for points in [random_coefficients(100), subgroup, Domain.get(256, 5)]:
+        assert vanishing.eval_many(points) == dense.eval_many(points)
+
+
+def original_levels(data):
+    """
+    The hex digests of the levels of the Merkle tree as it was originally built, from the leaves
+    to the root: leaves padded with FieldElement(0), and hashed as sha256 of their string, and
+    inner nodes hashed as sha256 of the concatenated hex digests of their children.
+    """
+    num_leaves = 2 ** ceil(log2(len(data)))
+    leaves = data + [FieldElement(0)] * (num_leaves - len(data))
+    levels = [[sha256(str(leaf).encode()).hexdigest() for leaf in leaves]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append(
+            [
+                sha256((left + right).encode()).hexdigest()
+                for left, right in zip(level[::2], level[1::2])
+            ]
+        )
+    return levels
+
+
+def original_path(levels, leaf_id):
+    """
+    The authentication path of a leaf in the original tree, from the top down.
+    """
+    path = []
+    for level in levels[:-1]:
+        path.append(level[leaf_id ^ 1])
+        leaf_id >>= 1
+    return path[::-1]
+
+
+@pytest.mark.parametrize("n", [1, 2, 5, 8, 13])
+def test_compatible_merkle_tree_matches_original(n):
+    data = [FieldElement(random.randrange(P)) for _ in range(n)]
+    tree = MerkleTree(data, compatible=True)
+    levels = original_levels(data)
+    assert tree.root == levels[-1][0]
+    for leaf_id in range(2**tree.height):
+        path = tree.get_authentication_path(leaf_id)
+        assert path == original_path(levels, leaf_id)
+        if leaf_id < n:
+            assert verify_decommitment(leaf_id, data[leaf_id], path, tree.root)
+
+
+@pytest.mark.parametrize("hasher", [SHA256, PEDERSEN])
+@pytest.mark.parametrize("n, width", [(1, 1), (13, 1), (16, 3), (21, 2)])
+def test_streaming_merkle_tree_matches_merkle_tree(tmp_path, hasher, n, width):
+    rows = np.array([random_coefficients(width) for _ in range(n)], dtype=np.uint64)
+    tree = MerkleTree(rows if width > 1 else rows[:, 0], hasher=hasher)
+    leaf_file = tmp_path / "leaves"
+    leaf_file.write_bytes(rows.astype(">u4").tobytes())
+    leaves = rows.tolist() if width > 1 else rows[:, 0].tolist()
+    for source in [leaves, leaf_file]:
+        nodes = tmp_path / "nodes"
+        with StreamingMerkleTree(source, nodes, width, hasher, 4) as streaming:
+            assert streaming.root == tree.root
+            paths = map(streaming.get_authentication_path, range(2**tree.height))
+            assert list(paths) == [
+                tree.get_authentication_path(leaf_id)
+                for leaf_id in range(2**tree.height)
+            ]
+
+
+@pytest.mark.parametrize("width", [1, 3])
+def test_streaming_merkle_tree_of_memmap_matches_merkle_tree(tmp_path, width):
+    vals = np.array(random_coefficients(300 * width), dtype=np.uint64)
+    leaf_file = tmp_path / "leaves"
+    leaf_file.write_bytes(vals.astype(">u4").tobytes())
+    memmap = np.memmap(leaf_file, dtype=">u4", mode="r")
+    shaped = np.memmap(leaf_file, dtype=">u4", mode="r", shape=(10, width))
+    sliced = memmap.reshape(-1, width)[100:200]
+    for leaves in [shaped, sliced]:
+        rows = np.array(leaves, dtype=np.uint64)
+        tree = MerkleTree(rows if width > 1 else rows[:, 0])
+        nodes = tmp_path / "nodes"
+        with StreamingMerkleTree(leaves, nodes, width, chunk_size=16) as streaming:
+            assert streaming.height == tree.height
+            assert streaming.root == tree.root
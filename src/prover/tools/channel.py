@@ -15,10 +15,12 @@
 ###############################################################################
 
 
-import inspect
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha256
 
-from tools.field import FieldElement
+import numpy as np
+
+from tools.field import FieldElement, FieldVector
 
 
 def serialize(obj):
@@ -30,6 +32,120 @@ def serialize(obj):
     return obj._serialize_()
 
 
+GRINDING_CHUNK_SIZE = 2 ** 14
+
+
+def expand_words(seed, count, counter=0):
+    """
+    Returns count uniformly random 32-bit words, expanded from the seed in counter mode: block i
+    is sha256(seed || i), with i as 8 big-endian bytes, and holds 8 words.
+    """
+    hasher = sha256(seed)
+    blocks = []
+    for i in range(counter, counter + -(-count // 8)):
+        h = hasher.copy()
+        h.update(i.to_bytes(8, 'big'))
+        blocks.append(h.digest())
+    return np.frombuffer(b''.join(blocks), dtype='>u4')[:count].astype(np.uint64)
+
+
+def expand_below(seed, n, bound):
+    """
+    Returns n uniformly random integers in [0, bound), as a uint64 array, expanded from the seed.
+    The 32-bit words above the largest multiple of bound are rejected.
+    """
+    limit = (2 ** 32 // bound) * bound
+    res = np.empty(0, dtype=np.uint64)
+    counter = 0
+    while len(res) < n:
+        # enough words for the remaining values with high probability
+        count = 8 * -(-((n - len(res)) * 2 ** 32 // limit + 8) // 8)
+        words = expand_words(seed, count, counter)
+        counter += count // 8
+        res = np.concatenate([res, words[words < limit] % bound])
+    return res[:n]
+
+
+def expand_field_elements(seed, n):
+    """
+    Returns n uniformly random field elements, as a uint64 array, expanded from the seed.
+    """
+    return expand_below(seed, n, FieldElement.k_modulus)
+
+
+def expand_indices(seed, n, size):
+    """
+    Returns n distinct uniformly random integers in [0, size), in the order they are drawn,
+    expanded from the seed.
+    """
+    assert n <= size, 'Cannot draw more distinct indices than the size.'
+    indices = {}
+    drawn = 0
+    while len(indices) < n:
+        drawn += n
+        indices = dict.fromkeys(expand_below(seed, drawn, size).tolist())
+    return list(indices)[:n]
+
+
+def state_bytes(state):
+    """
+    The bytes a nonce is appended to when grinding: the hex string state of a Channel, or the digest
+    of a BinaryChannel.
+    """
+    return state if isinstance(state, bytes) else state.encode()
+
+
+def is_valid_nonce(state, bits, nonce):
+    """
+    Checks that sha256(state || nonce), with the nonce as 8 big-endian bytes, starts with bits zero
+    bits.
+    """
+    digest = sha256(state_bytes(state) + nonce.to_bytes(8, 'big')).digest()
+    return int.from_bytes(digest, 'big') >> (256 - bits) == 0
+
+
+def search_nonces(state, bits, start, stop):
+    """
+    Returns the smallest valid nonce in [start, stop), or None.
+    """
+    hasher = sha256(state_bytes(state))
+    for nonce in range(start, stop):
+        h = hasher.copy()
+        h.update(nonce.to_bytes(8, 'big'))
+        if int.from_bytes(h.digest(), 'big') >> (256 - bits) == 0:
+            return nonce
+    return None
+
+
+def _search_chunk(args):
+    return search_nonces(*args)
+
+
+def find_nonce(state, bits, processes=None):
+    """
+    Returns the smallest nonce such that sha256(state || nonce) starts with bits zero bits.
+    The nonces are searched in chunks of GRINDING_CHUNK_SIZE. With processes, each round hands one
+    chunk to each process of a pool, and the first chunk of the round holding a valid nonce gives
+    the result, so that the nonce does not depend on the number of processes.
+    """
+    if processes is None or processes <= 1:
+        start = 0
+        while True:
+            nonce = search_nonces(state, bits, start, start + GRINDING_CHUNK_SIZE)
+            if nonce is not None:
+                return nonce
+            start += GRINDING_CHUNK_SIZE
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        start = 0
+        while True:
+            chunks = [(state, bits, start + i * GRINDING_CHUNK_SIZE,
+                       start + (i + 1) * GRINDING_CHUNK_SIZE) for i in range(processes)]
+            for nonce in executor.map(_search_chunk, chunks):
+                if nonce is not None:
+                    return nonce
+            start += processes * GRINDING_CHUNK_SIZE
+
+
 class Channel(object):
     """
     A Channel instance can be used by a prover or a verifier to preserve the semantics of an
@@ -45,7 +161,20 @@ class Channel(object):
 
     def send(self, s):
         self.state = sha256((self.state + s).encode()).hexdigest()
-        self.proof.append(f'{inspect.stack()[0][3]}:{s}')
+        self.proof.append(f'send:{s}')
+
+    def send_root(self, root):
+        """
+        Sends a Merkle root, given as a hex string or as bytes.
+        """
+        self.send(root if isinstance(root, str) else root.hex())
+
+    def send_field_elements(self, values, prefix=''):
+        """
+        Sends a list of FieldElements, as the prefix followed by their comma-separated
+        representations.
+        """
+        self.send(prefix + ','.join(map(repr, values)))
 
     def receive_random_int(self, min, max, show_in_proof=True):
         """
@@ -59,7 +188,119 @@ class Channel(object):
         num = min + (int(self.state, 16) % (max - min + 1))
         self.state = sha256((self.state).encode()).hexdigest()
         if show_in_proof:
-            self.proof.append(f'{inspect.stack()[0][3]}:{num}')
+            self.proof.append(f'receive_random_int:{num}')
+        return num
+
+    def receive_random_field_element(self):
+        """
+        Emulates a random field element sent by the verifier.
+        """
+        num = self.receive_random_int(0, FieldElement.k_modulus - 1, show_in_proof=False)
+        self.proof.append(f'receive_random_field_element:{num}')
+        return FieldElement(num)
+
+    def receive_random_field_elements(self, n, as_vector=False):
+        """
+        Emulates n uniformly random field elements sent by the verifier, drawn at once from the
+        state. Returns a list of FieldElements, or a FieldVector if as_vector is set.
+        """
+        vals = expand_field_elements(self.state.encode(), n)
+        self.state = sha256((self.state).encode()).hexdigest()
+        self.proof.append(f'receive_random_field_elements:{",".join(map(str, vals.tolist()))}')
+        res = FieldVector._wrap(vals)
+        return res if as_vector else res.to_elements()
+
+    def receive_random_indices(self, n, size):
+        """
+        Emulates n distinct uniformly random indices in [0, size) sent by the verifier, drawn at
+        once from the state.
+        """
+        indices = expand_indices(self.state.encode(), n, size)
+        self.state = sha256((self.state).encode()).hexdigest()
+        self.proof.append(f'receive_random_indices:{",".join(map(str, indices))}')
+        return indices
+
+    def grind(self, bits, processes=None):
+        """
+        Proof of work: finds the smallest nonce such that sha256(state || nonce) starts with bits
+        zero bits, and sends it. Every later random value then costs 2**bits hashes to a prover
+        trying to bias it, which replaces bits / log2(blowup) FRI queries.
+        """
+        nonce = find_nonce(self.state, bits, processes)
+        self.state = sha256((self.state + str(nonce)).encode()).hexdigest()
+        self.proof.append(f'grind:{nonce}')
+        return nonce
+
+
+class BinaryChannel(object):
+    """
+    A Channel working on bytes: it feeds a single running Sha256 with fixed-width binary data,
+    a digest per Merkle root and 4 bytes per FieldElement, each message preceded by a one-byte tag
+    (and a 4-byte length when its size varies). The randomness is the digest of everything sent so
+    far, and the proof entries are tuples of the method name and the raw value.
+    It has the same methods as Channel, and is equally deterministic, but its transcript and
+    randomness differ from those of Channel.
+    """
+
+    SEND = b'\x00'
+    ROOT = b'\x01'
+    FIELD_ELEMENTS = b'\x02'
+    RANDOM = b'\x03'
+    NONCE = b'\x04'
+
+    def __init__(self):
+        self.hasher = sha256()
+        self.proof = []
+
+    @property
+    def state(self):
+        return self.hasher.digest()
+
+    def absorb(self, tag, data):
+        self.hasher.update(tag)
+        self.hasher.update(data)
+
+    def send(self, s):
+        data = s if isinstance(s, bytes) else s.encode()
+        self.absorb(self.SEND, len(data).to_bytes(4, 'big') + data)
+        self.proof.append(('send', data))
+
+    def send_root(self, root):
+        """
+        Sends a Merkle root, given as a hex string or as bytes. Its size is fixed by the hash
+        function of the tree, 32 bytes for sha256.
+        """
+        data = root if isinstance(root, bytes) else bytes.fromhex(root)
+        self.absorb(self.ROOT, data)
+        self.proof.append(('send_root', data))
+
+    def send_field_elements(self, values, prefix=''):
+        """
+        Sends a list of FieldElements (or ints), or a FieldVector, 4 big-endian bytes each, encoded
+        at once. The prefix only labels the entry of the proof.
+        """
+        vals = values.vals if isinstance(values, FieldVector) else FieldVector(values).vals
+        data = vals.astype('>u4').tobytes()
+        self.absorb(self.FIELD_ELEMENTS, len(vals).to_bytes(4, 'big') + data)
+        self.proof.append(('send_field_elements', prefix, tuple(vals.tolist())))
+
+    def random_bytes(self):
+        """
+        Returns the 32 bytes of randomness of the current state, and moves to the next state.
+        """
+        digest = self.hasher.digest()
+        self.hasher.update(self.RANDOM)
+        return digest
+
+    def receive_random_int(self, min, max, show_in_proof=True):
+        """
+        Emulates a random integer sent by the verifier in the range [min, max] (including min and
+        max).
+        """
+        # As in Channel, this is only close to uniform.
+        num = min + (int.from_bytes(self.random_bytes(), 'big') % (max - min + 1))
+        if show_in_proof:
+            self.proof.append(('receive_random_int', num))
         return num
 
     def receive_random_field_element(self):
@@ -67,5 +308,32 @@ class Channel(object):
         Emulates a random field element sent by the verifier.
         """
         num = self.receive_random_int(0, FieldElement.k_modulus - 1, show_in_proof=False)
-        self.proof.append(f'{inspect.stack()[0][3]}:{num}')
-        return FieldElement(num)
\ No newline at end of file
+        self.proof.append(('receive_random_field_element', num))
+        return FieldElement(num)
+
+    def receive_random_field_elements(self, n, as_vector=False):
+        """
+        Emulates n uniformly random field elements sent by the verifier, see
+        Channel.receive_random_field_elements.
+        """
+        vals = expand_field_elements(self.random_bytes(), n)
+        self.proof.append(('receive_random_field_elements', tuple(vals.tolist())))
+        res = FieldVector._wrap(vals)
+        return res if as_vector else res.to_elements()
+
+    def receive_random_indices(self, n, size):
+        """
+        Emulates n distinct uniformly random indices in [0, size) sent by the verifier.
+        """
+        indices = expand_indices(self.random_bytes(), n, size)
+        self.proof.append(('receive_random_indices', tuple(indices)))
+        return indices
+
+    def grind(self, bits, processes=None):
+        """
+        Proof of work, see Channel.grind. The nonce is appended to the digest of the transcript.
+        """
+        nonce = find_nonce(self.state, bits, processes)
+        self.absorb(self.NONCE, nonce.to_bytes(8, 'big'))
+        self.proof.append(('grind', nonce))
+        return nonce
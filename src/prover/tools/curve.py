@@ -91,9 +91,20 @@ class Curve:
     # Computing with trace
     ############################
 
-    def verifiable_add(self, p: CurvePoint, q: CurvePoint):
+    # the slopes are computed from the inverse of their denominator, so that a caller computing
+    # several of them can invert all the denominators at once with FieldElement.batch_inverse
+
+    def add_denominator(self, p: CurvePoint, q: CurvePoint):
+        return q.x - p.x
+
+    def double_denominator(self, p: CurvePoint):
+        return FieldElement(2) * p.y
+
+    def verifiable_add(self, p: CurvePoint, q: CurvePoint, denominator_inv=None):
         assert p != q
-        coef = (q.y - p.y) / (q.x - p.x)
+        if denominator_inv is None:
+            denominator_inv = self.add_denominator(p, q).inverse()
+        coef = (q.y - p.y) * denominator_inv
 
         if p == O:
             return coef, q
@@ -104,9 +115,11 @@ class Curve:
             y = coef * (p.x - x) - p.y
             return coef, CurvePoint(x, y)
 
-    def verifiable_double(self, p: CurvePoint):
+    def verifiable_double(self, p: CurvePoint, denominator_inv=None):
 
-        coef = (FieldElement(3) * (p.x**2) + self.alpha) / (FieldElement(2) * p.y)
+        if denominator_inv is None:
+            denominator_inv = self.double_denominator(p).inverse()
+        coef = (FieldElement(3) * (p.x**2) + self.alpha) * denominator_inv
 
         if p.infinity.val:
             return coef, O
@@ -132,19 +145,23 @@ class Curve:
             # in the bit one
             registers[1][i + 1] = FieldElement(bit)
 
+            # both slopes of this step only need one inversion
+            to_double = R0 if bit == 0 else R1
+            add_inv, double_inv = FieldElement.batch_inverse(
+                [self.add_denominator(R1, R0), self.double_denominator(to_double)]
+            )
+
             # in the add ones
-            coef, added = self.verifiable_add(R1, R0)
+            coef, added = self.verifiable_add(R1, R0, add_inv)
             registers[2][i + 1] = coef
             added.write(registers, i + 1, 3)
 
+            to_double.write(registers, i + 1, 6)
+            coef, doubled = self.verifiable_double(to_double, double_inv)
             if bit == 0:
-                R0.write(registers, i + 1, 6)
-                coef, doubled = self.verifiable_double(R0)
                 R1 = added
                 R0 = doubled
             else:
-                R1.write(registers, i + 1, 6)
-                coef, doubled = self.verifiable_double(R1)
                 R1 = doubled
                 R0 = added
             registers[9][i + 1] = coef
@@ -0,0 +1,91 @@
+"""
+Evaluation domains: the subgroups of power-of-two order of the multiplicative group of the field
+and their cosets, along with the tables the NTT and FRI need over them.
+"""
+
+from functools import cached_property
+
+from tools.field import FieldElement, FieldVector
+from tools.ntt import root_of_unity, twiddle_table
+
+
+class Domain:
+    """
+    Represents the coset offset * <w> of the subgroup of order size, where w = root_of_unity(size),
+    ordered as [offset * w**i for i in range(size)].
+    Its elements and tables are computed once, on first use. Use Domain.get to share a domain (and
+    so its tables) across proofs.
+    """
+
+    _cache = {}
+
+    def __init__(self, size, offset=FieldElement.one()):
+        self.size = size
+        self.offset = FieldElement.typecast(offset)
+        self.generator = root_of_unity(size)
+
+    @staticmethod
+    def get(size, offset=FieldElement.one()):
+        """
+        Returns the domain of the given size and offset, memoized per (size, offset).
+        """
+        key = (size, FieldElement.typecast(offset).val)
+        if key not in Domain._cache:
+            Domain._cache[key] = Domain(size, offset)
+        return Domain._cache[key]
+
+    @cached_property
+    def vector(self):
+        """
+        The elements of the domain as a FieldVector, computed incrementally.
+        """
+        return FieldVector.powers(self.generator, self.size, self.offset)
+
+    @cached_property
+    def elements(self):
+        """
+        The elements of the domain as a list of FieldElements.
+        """
+        return self.vector.to_elements()
+
+    @property
+    def twiddles(self):
+        """
+        The NTT twiddles of the domain: [w**i for i in range(size // 2)].
+        """
+        return FieldVector._wrap(twiddle_table(self.size, self.generator.val))
+
+    @property
+    def inverse_twiddles(self):
+        """
+        The inverse NTT twiddles of the domain: [w**-i for i in range(size // 2)].
+        """
+        return FieldVector._wrap(twiddle_table(self.size, self.generator.inverse().val))
+
+    @cached_property
+    def inverses(self):
+        """
+        The inverses of the elements of the domain as a FieldVector, computed with one batched
+        inversion. FRI folding divides by them.
+        """
+        return self.vector.inverse()
+
+    def next_fri_domain(self, folding_factor=2):
+        """
+        Returns the domain of the folding_factor-th powers of the elements of this one, i.e. those
+        of its first size / folding_factor elements, in the same order.
+        """
+        assert self.size % folding_factor == 0, "The domain cannot be folded."
+        return Domain.get(self.size // folding_factor, self.offset**folding_factor)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        return self.elements[key]
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __repr__(self):
+        return f"Domain({self.size}, {self.offset!r})"
@@ -21,7 +21,11 @@ An implementation of field elements from F_(2**251 + 17 * 2**192 + 1).
 
 from random import randint
 
+import numpy as np
+
 P = 3 * 2**30 + 1
+# The primes dividing P - 1 = 3 * 2**30.
+P_MINUS_ONE_PRIMES = [2, 3]
 
 
 class FieldElement:
@@ -132,18 +136,45 @@ class FieldElement:
         assert r == 1
         return FieldElement(t)
 
+    @staticmethod
+    def batch_inverse(values, allow_zero=False):
+        """
+        Inverts all the given elements with Montgomery's trick, using 3(n-1) multiplications and a
+        single call to inverse.
+        Zero has no inverse: it fails the same assertion as inverse, unless allow_zero is set, in
+        which case zeros are skipped by the running product and mapped to zero.
+        """
+        vals = [FieldElement.typecast(v).val for v in values]
+        nonzero = [i for i, v in enumerate(vals) if v != 0]
+        assert allow_zero or len(nonzero) == len(vals), "Cannot invert zero."
+        res = [FieldElement.zero()] * len(vals)
+        if not nonzero:
+            return res
+        # prefix[j] is the product of the j first non-zero values.
+        prefix = [1]
+        for i in nonzero[:-1]:
+            prefix.append(prefix[-1] * vals[i] % FieldElement.k_modulus)
+        inv = FieldElement(prefix[-1] * vals[nonzero[-1]]).inverse().val
+        for j in reversed(range(len(nonzero))):
+            i = nonzero[j]
+            res[i] = FieldElement(inv * prefix[j])
+            inv = inv * vals[i] % FieldElement.k_modulus
+        return res
+
     def is_order(self, n):
         """
-        Naively checks that the element is of order n by raising it to all powers up to n, checking
-        that the element to the n-th power is the unit, but not so for any k<n.
+        Checks that the element is of order n in O(log n) multiplications: the element to the n-th
+        power is the unit, but not so to the (n/q)-th power for any prime q dividing n.
+        Orders divide P - 1, so n must divide it too and its primes are those of P - 1.
         """
         assert n >= 1
-        h = FieldElement(1)
-        for _ in range(1, n):
-            h *= self
-            if h == FieldElement(1):
-                return False
-        return h * self == FieldElement(1)
+        if (FieldElement.k_modulus - 1) % n != 0 or self**n != FieldElement(1):
+            return False
+        return all(
+            self ** (n // q) != FieldElement(1)
+            for q in P_MINUS_ONE_PRIMES
+            if n % q == 0
+        )
 
     def _serialize_(self):
         return repr(self.val)
@@ -154,3 +185,195 @@ class FieldElement:
         while fe in exclude_elements:
             fe = FieldElement(randint(0, FieldElement.k_modulus - 1))
         return fe
+
+
+class FieldVector:
+    """
+    Represents a vector of elements of the field, stored as a numpy array.
+    Since P < 2**32, the product of two reduced elements fits in a uint64, so every operation is
+    done on whole arrays without allocating a FieldElement per entry.
+    """
+
+    def __init__(self, values):
+        if isinstance(values, FieldVector):
+            self.vals = values.vals.copy()
+        elif isinstance(values, np.ndarray):
+            self.vals = np.asarray(values % FieldElement.k_modulus, dtype=np.uint64)
+        else:
+            self.vals = np.fromiter(
+                (FieldVector._to_int(v) for v in values),
+                dtype=np.uint64,
+                count=len(values),
+            )
+
+    @staticmethod
+    def _to_int(value):
+        if isinstance(value, FieldElement):
+            return value.val
+        return value % FieldElement.k_modulus
+
+    @classmethod
+    def _wrap(cls, vals):
+        """
+        Wraps an already reduced uint64 array without copying it.
+        """
+        res = cls.__new__(cls)
+        res.vals = vals
+        return res
+
+    @staticmethod
+    def zeros(n):
+        return FieldVector._wrap(np.zeros(n, dtype=np.uint64))
+
+    @staticmethod
+    def ones(n):
+        return FieldVector._wrap(np.ones(n, dtype=np.uint64))
+
+    @staticmethod
+    def powers(base, n, offset=1):
+        """
+        Returns [offset * base**i for i in range(n)], built by repeated doubling of the computed
+        prefix instead of n independent exponentiations.
+        """
+        base = FieldElement.typecast(base)
+        vals = np.empty(n, dtype=np.uint64)
+        if n == 0:
+            return FieldVector._wrap(vals)
+        vals[0] = FieldElement.typecast(offset).val
+        filled, step = 1, base
+        while filled < n:
+            count = min(filled, n - filled)
+            vals[filled : filled + count] = (vals[:count] * np.uint64(step.val)) % P
+            filled += count
+            step *= step
+        return FieldVector._wrap(vals)
+
+    @staticmethod
+    def from_elements(elements):
+        return FieldVector(elements)
+
+    def to_elements(self):
+        return [FieldElement(int(v)) for v in self.vals]
+
+    def __len__(self):
+        return len(self.vals)
+
+    def __iter__(self):
+        return iter(self.to_elements())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return FieldElement(int(self.vals[key]))
+        return FieldVector._wrap(self.vals[key])
+
+    def roll(self, shift):
+        """
+        Returns the vector whose i-th entry is the (i - shift)-th entry of this one, cyclically.
+        """
+        return FieldVector._wrap(np.roll(self.vals, shift))
+
+    def __repr__(self):
+        return f"FieldVector({self.to_elements()!r})"
+
+    @staticmethod
+    def _operand(other):
+        """
+        Returns `other` as a uint64 array or scalar, or None if it cannot be used as an operand.
+        """
+        if isinstance(other, FieldVector):
+            return other.vals
+        if isinstance(other, (int, FieldElement)):
+            return np.uint64(FieldElement.typecast(other).val)
+        return None
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            other = FieldVector(other)
+        if not isinstance(other, FieldVector):
+            return False
+        return np.array_equal(self.vals, other.vals)
+
+    __hash__ = None
+
+    def __neg__(self):
+        return FieldVector._wrap((np.uint64(P) - self.vals) % P)
+
+    def __add__(self, other):
+        other = FieldVector._operand(other)
+        if other is None:
+            return NotImplemented
+        return FieldVector._wrap((self.vals + other) % P)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = FieldVector._operand(other)
+        if other is None:
+            return NotImplemented
+        return FieldVector._wrap((self.vals + (np.uint64(P) - other)) % P)
+
+    def __rsub__(self, other):
+        return -(self - other)
+
+    def __mul__(self, other):
+        other = FieldVector._operand(other)
+        if other is None:
+            return NotImplemented
+        return FieldVector._wrap((self.vals * other) % P)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, FieldVector):
+            return self * other.inverse()
+        return self * FieldElement.typecast(other).inverse()
+
+    def __rtruediv__(self, other):
+        return self.inverse() * other
+
+    def inverse(self, allow_zero=False):
+        """
+        Inverts every entry with Montgomery's trick, laid out as a product tree so that each of its
+        log(n) levels is a single vectorized multiplication: about 3n multiplications and one
+        inversion overall.
+        Zeros are handled as in FieldElement.batch_inverse.
+        """
+        vals = self.vals
+        zeros = vals == 0
+        has_zeros = bool(zeros.any())
+        if has_zeros:
+            assert allow_zero, "Cannot invert zero."
+            vals = np.where(zeros, np.uint64(1), vals)
+        n = len(vals)
+        if n == 0:
+            return FieldVector.zeros(0)
+        # Pad with ones up to a power of two, so that every level pairs its entries.
+        level = np.ones(1 << (n - 1).bit_length(), dtype=np.uint64)
+        level[:n] = vals
+        levels = [level]
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            levels.append((level[0::2] * level[1::2]) % P)
+        inv = np.array(
+            [FieldElement(int(levels[-1][0])).inverse().val], dtype=np.uint64
+        )
+        for level in reversed(levels[:-1]):
+            children = np.empty_like(level)
+            children[0::2] = (inv * level[1::2]) % P
+            children[1::2] = (inv * level[0::2]) % P
+            inv = children
+        inv = inv[:n]
+        if has_zeros:
+            inv[zeros] = 0
+        return FieldVector._wrap(inv)
+
+    def __pow__(self, n):
+        assert n >= 0
+        cur_pow = self.vals
+        res = np.ones_like(self.vals)
+        while n > 0:
+            if n % 2 != 0:
+                res = (res * cur_pow) % P
+            n = n // 2
+            cur_pow = (cur_pow * cur_pow) % P
+        return FieldVector._wrap(res)
@@ -0,0 +1,320 @@
+"""
+FRI commitment and query checks over the evaluations of the composition polynomial, folding every
+layer by a configurable factor k: the k points of the domain whose k-th powers are equal form a
+coset, whose values give one value of the next layer. Folding stops at a remainder polynomial of
+small degree, which is sent in the clear instead of the last layers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tools.channel import Channel
+from tools.field import P, FieldElement, FieldVector
+from tools.hashers import SHA256
+from tools.merkle import MerkleTree, verify_multiproof
+from tools.ntt import intt_array
+from tools.polynomial import Polynomial, interpolate_poly_ntt
+
+
+def fold_cosets(cosets, x_inverses, beta, zeta):
+    """
+    Folds cosets of a FRI layer.
+    cosets: a uint64 array of shape (q, k), whose row i holds f(x_i * zeta**j) for j < k, where
+    zeta is of order k.
+    x_inverses: a uint64 array of the q inverses of x_i.
+    Writing f(x) = sum(x**r * f_r(x**k) for r < k), returns the q values of
+    f_next(x_i**k) = sum(beta**r * f_r(x_i**k) for r < k): the polynomial interpolating the coset
+    at the points zeta**j, evaluated at beta / x_i. For k = 2 this is the usual
+    (f(x) + f(-x)) / 2 + beta * (f(x) - f(-x)) / (2x).
+    """
+    # coefficients[i][r] = x_i**r * f_r(x_i**k), with an inverse NTT of size k per coset
+    coefficients = intt_array(cosets, zeta)
+    t = (x_inverses * np.uint64(FieldElement.typecast(beta).val)) % P
+    res = np.zeros(len(cosets), dtype=np.uint64)
+    for r in reversed(range(cosets.shape[1])):
+        res = (res * t + coefficients[:, r]) % P
+    return res
+
+
+def fold_layer(layer, domain, beta, folding_factor=2):
+    """
+    Returns the next FRI domain and layer, computed from the evaluations of the current layer only.
+    The cosets of the domain are the points i + j * m for j < k, where m = len(domain) / k.
+    """
+    k = min(folding_factor, len(domain))
+    m = len(domain) // k
+    cosets = layer.vals.reshape(k, m).T
+    zeta = domain.generator**m
+    next_layer = fold_cosets(cosets, domain.inverses.vals[:m], beta, zeta)
+    return domain.next_fri_domain(k), FieldVector._wrap(next_layer)
+
+
+def coset_rows(layer, folding_factor=2):
+    """
+    Returns the layer as a uint64 array of shape (m, k), for k = min(folding_factor, len(layer)),
+    whose row i holds the coset folded into the value i of the next layer.
+    """
+    k = min(folding_factor, len(layer))
+    return layer.vals.reshape(k, len(layer) // k).T
+
+
+def commit_layer(
+    layer, folding_factor=2, compatible=False, coset_leaves=False, hasher=SHA256
+):
+    """
+    Returns the Merkle tree of a layer, with one leaf per value, or with coset_leaves one leaf per
+    coset of folding_factor values, so that a query opens a single leaf of the layer.
+    """
+    layer = layer if isinstance(layer, FieldVector) else FieldVector(layer)
+    leaves = coset_rows(layer, folding_factor) if coset_leaves else layer
+    return MerkleTree(leaves, compatible, hasher)
+
+
+def layer_polynomial(layer, domain):
+    """
+    Returns the polynomial of degree < len(domain) evaluating to the layer over the domain.
+    """
+    return interpolate_poly_ntt(layer, domain.generator, domain.offset)
+
+
+def layer_sizes(domain_size, degree_bound, folding_factor=2, remainder_degree=0):
+    """
+    Returns the sizes of the FRI domains, from the evaluation domain to the domain of the
+    remainder, for evaluations of a polynomial of degree below degree_bound. Folding by k divides
+    the domain size and the degree bound by k, until the degree bound is at most
+    remainder_degree + 1. The sizes only depend on these parameters, so that a verifier knows them
+    in advance.
+    """
+    assert folding_factor >= 2, "The folding factor is below 2."
+    assert degree_bound <= domain_size, "The degree bound exceeds the domain size."
+    sizes = [domain_size]
+    while degree_bound > remainder_degree + 1:
+        k = min(folding_factor, sizes[-1])
+        sizes.append(sizes[-1] // k)
+        degree_bound = -(-degree_bound // k)
+    return sizes
+
+
+def remainder_bound(degree_bound, sizes):
+    """
+    Returns the degree bound of the remainder polynomial for the domain sizes of layer_sizes: the
+    degree bound divided by all the folding factors, rounded up. It is at most
+    remainder_degree + 1, and below it when the last fold overshoots, where a remainder of degree
+    remainder_degree could match any last layer.
+    """
+    return -(-degree_bound * sizes[-1] // sizes[0])
+
+
+def remainder_polynomial(poly, remainder_degree=0):
+    """
+    Returns the remainder polynomial sent for a last layer of polynomial poly: its coefficients up
+    to remainder_degree. These are all of them unless the committed evaluations exceeded the
+    degree bound, in which case the queries do not match the remainder.
+    """
+    return Polynomial(poly.coeffs[: remainder_degree + 1])
+
+
+def send_remainder(channel: Channel, remainder):
+    channel.send_field_elements(remainder.poly, "fri remainder: ")
+
+
+def fri_commit(
+    domain,
+    evaluations,
+    merkle,
+    channel: Channel,
+    degree_bound,
+    folding_factor=2,
+    remainder_degree=0,
+):
+    """
+    Folds the evaluations over the domain, with one random beta per layer, as many times as
+    layer_sizes gives for polynomials of degree below degree_bound. Every layer that is folded
+    again is committed with a Merkle tree, in the mode of the tree of the evaluations (see
+    commit_layer), while the coefficients of the last one, the remainder polynomial, are sent
+    instead.
+    Returns the domains, layers, merkle trees (one per layer but the last one), betas and the
+    remainder polynomial.
+    """
+    fri_domains = [domain]
+    fri_layers = [FieldVector(evaluations)]
+    fri_merkles = [merkle]
+    fri_betas = []
+    # the layers are committed like the evaluations
+    compatible = merkle is not None and merkle.compatible
+    coset_leaves = merkle is not None and merkle.leaf_width > 1
+    hasher = SHA256 if merkle is None else merkle.hasher
+    sizes = layer_sizes(len(domain), degree_bound, folding_factor, remainder_degree)
+    for layer_id in range(1, len(sizes)):
+        beta = channel.receive_random_int(0, P - 1)
+        next_domain, next_layer = fold_layer(
+            fri_layers[-1], fri_domains[-1], beta, folding_factor
+        )
+        fri_domains.append(next_domain)
+        fri_layers.append(next_layer)
+        fri_betas.append(beta)
+        if layer_id + 1 < len(sizes):
+            fri_merkles.append(
+                commit_layer(
+                    next_layer, folding_factor, compatible, coset_leaves, hasher
+                )
+            )
+            channel.send_root(fri_merkles[-1].root)
+
+    remainder = remainder_polynomial(
+        layer_polynomial(fri_layers[-1], fri_domains[-1]),
+        remainder_bound(degree_bound, sizes) - 1,
+    )
+    send_remainder(channel, remainder)
+    return fri_domains, fri_layers, fri_merkles, fri_betas, remainder
+
+
+def num_queries(security_bits, blowup, grinding_bits=0):
+    """
+    Returns the number of queries reaching security_bits bits of security, each query bringing
+    log2(blowup) bits and the grinding the rest.
+    """
+    bits_per_query = blowup.bit_length() - 1
+    return max(0, -(-(security_bits - grinding_bits) // bits_per_query))
+
+
+def verify_query(
+    query_id,
+    fri_domains,
+    fri_layers,
+    fri_merkles,
+    fri_betas,
+    remainder,
+    degree_bound,
+    folding_factor=2,
+    remainder_degree=0,
+):
+    """
+    Checks a single query, see verify_queries.
+    """
+    return verify_queries(
+        [query_id],
+        fri_domains,
+        fri_layers,
+        fri_merkles,
+        fri_betas,
+        remainder,
+        degree_bound,
+        folding_factor,
+        remainder_degree,
+    )
+
+
+def verify_queries(
+    query_ids,
+    fri_domains,
+    fri_layers,
+    fri_merkles,
+    fri_betas,
+    remainder,
+    degree_bound,
+    folding_factor=2,
+    remainder_degree=0,
+    processes=None,
+):
+    """
+    Checks that the proof has the layers that layer_sizes gives for the degree bound, that each
+    layer along the path of every query folds into the next one, that the opened values match the
+    Merkle commitments of their layer, and that the last layer agrees with the remainder
+    polynomial, so that the evaluations are close to a polynomial of degree below degree_bound.
+    The layers are walked one after the other for all the queries at once: queries landing in the
+    same coset of a layer are checked once, all the divisions of a layer are done with a single
+    batch inversion, and the remainder is evaluated at all the final points together.
+    With processes, the queries are split into groups checked by a pool of that many processes.
+    """
+    query_ids = sorted(set(query_ids))
+    if processes is not None and processes > 1 and len(query_ids) > 1:
+        groups = [query_ids[i::processes] for i in range(processes)]
+        args = (
+            fri_domains,
+            fri_layers,
+            fri_merkles,
+            fri_betas,
+            remainder,
+            degree_bound,
+            folding_factor,
+            remainder_degree,
+        )
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return all(
+                executor.map(
+                    _verify_group, [(group, *args) for group in groups if group]
+                )
+            )
+
+    sizes = layer_sizes(
+        len(fri_domains[0]), degree_bound, folding_factor, remainder_degree
+    )
+    if [len(domain) for domain in fri_domains] != sizes:
+        return False
+    if len(fri_betas) != len(sizes) - 1:
+        return False
+    if remainder.degree() >= remainder_bound(degree_bound, sizes):
+        return False
+    fri_layers = [
+        layer if isinstance(layer, FieldVector) else FieldVector(layer)
+        for layer in fri_layers
+    ]
+    ids = np.array(query_ids, dtype=np.int64)
+    for layer_id, beta in enumerate(fri_betas):
+        domain, layer = fri_domains[layer_id], fri_layers[layer_id]
+        m = len(fri_domains[layer_id + 1])
+        k = len(domain) // m
+        # the queries of the layer, one per opened coset
+        ids = np.unique(ids % m)
+        opened = ids[:, None] + m * np.arange(k)
+        if not check_decommitments(fri_merkles[layer_id], opened.ravel(), layer):
+            return False
+        x_inverses = FieldVector._wrap(domain.vector.vals[ids]).inverse()
+        folded = fold_cosets(
+            layer.vals[opened], x_inverses.vals, beta, domain.generator**m
+        )
+        if layer_id + 1 < len(fri_betas):
+            # checked against the commitment of the next layer with its cosets
+            expected = fri_layers[layer_id + 1].vals[ids]
+        else:
+            expected = evaluate_remainder(remainder, fri_domains[-1], ids)
+        if not np.array_equal(folded, expected):
+            return False
+    if not fri_betas:
+        return check_decommitments(
+            fri_merkles[0], ids, fri_layers[0]
+        ) and np.array_equal(
+            fri_layers[0].vals[ids], evaluate_remainder(remainder, fri_domains[0], ids)
+        )
+    return True
+
+
+def _verify_group(args):
+    return verify_queries(*args)
+
+
+def check_decommitments(merkle, value_ids, layer):
+    """
+    Checks the values of the layer at the given indices against its Merkle tree, with a single
+    multiproof. A tree whose leaves are rows has one leaf per coset (see commit_layer).
+    """
+    if merkle.leaf_width == 1:
+        leaves = [(i, layer[i]) for i in value_ids.tolist()]
+    else:
+        rows = coset_rows(layer, merkle.leaf_width)
+        m = len(rows)
+        leaves = [
+            (i, tuple(FieldVector._wrap(rows[i])))
+            for i in np.unique(value_ids % m).tolist()
+        ]
+    leaves = dict(leaves)
+    proof = merkle.get_multiproof(leaves)
+    return verify_multiproof(merkle.root, leaves, proof, merkle.hasher)
+
+
+def evaluate_remainder(remainder, domain, ids):
+    return remainder.eval_many(
+        FieldVector._wrap(domain.vector.vals[ids]), as_vector=True
+    ).vals
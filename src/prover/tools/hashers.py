@@ -0,0 +1,135 @@
+"""
+Hash functions of a MerkleTree. A hasher digests the bytes of a leaf and the digests of two
+children, and also works on whole levels, so that a hasher can batch the nodes of a level.
+"""
+
+from abc import ABC, abstractmethod
+from hashlib import blake2s, sha256
+
+import numpy as np
+
+from tools.field import P
+from tools.pedersen import pedersen_hash_many
+
+
+class Hasher(ABC):
+    """
+    A hash function of digest_size bytes. The level methods hash consecutive leaves or pairs of
+    digests one by one, and can be overridden by hashers with a faster batched version.
+    """
+
+    name = None
+    digest_size = None
+
+    @abstractmethod
+    def hash_leaf(self, leaf):
+        """
+        Returns the digest of the bytes of a leaf.
+        """
+
+    @abstractmethod
+    def hash_node(self, left, right):
+        """
+        Returns the digest of an inner node from the digests of its children.
+        """
+
+    def hash_leaves(self, buffer, width):
+        """
+        Returns the concatenated digests of the consecutive leaves of width bytes of the buffer.
+        """
+        view = memoryview(buffer)
+        return b"".join(
+            self.hash_leaf(view[i : i + width]) for i in range(0, len(buffer), width)
+        )
+
+    def hash_level(self, level):
+        """
+        Returns the concatenated digests of the consecutive pairs of digests of the level.
+        """
+        size = self.digest_size
+        return b"".join(
+            self.hash_node(level[i : i + size], level[i + size : i + 2 * size])
+            for i in range(0, len(level), 2 * size)
+        )
+
+    def padding(self, width):
+        """
+        The leaf of width bytes completing a tree to a power of two leaves.
+        """
+        return bytes(width)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class HashlibHasher(Hasher):
+    """
+    A hasher from a hashlib constructor: leaves and nodes are the digests of their bytes.
+    """
+
+    digest_size = 32
+
+    def __init__(self, name, constructor):
+        self.name = name
+        self.constructor = constructor
+
+    def hash_leaf(self, leaf):
+        return self.constructor(leaf).digest()
+
+    def hash_node(self, left, right):
+        return self.constructor(bytes(left) + bytes(right)).digest()
+
+    def hash_level(self, level):
+        view = memoryview(level)
+        return b"".join(
+            self.constructor(view[i : i + 64]).digest()
+            for i in range(0, len(level), 64)
+        )
+
+
+class PedersenHasher(Hasher):
+    """
+    The Pedersen hash of tools.pedersen, whose digests are field elements, as 4 big-endian bytes.
+    A leaf of one field element is its own digest and a row is hashed from left to right, a node
+    is the Pedersen hash of its children, and a tree is completed with -1 leaves.
+    A level is hashed with pedersen_hash_many, which runs the ladders of all its nodes together.
+    """
+
+    name = "pedersen"
+    digest_size = 4
+
+    @staticmethod
+    def to_array(buffer):
+        return np.frombuffer(buffer, dtype=">u4").astype(np.uint64)
+
+    @staticmethod
+    def to_bytes(vals):
+        return vals.astype(">u4").tobytes()
+
+    def hash_leaves(self, buffer, width):
+        assert width % 4 == 0, "The leaves of a Pedersen tree are field elements."
+        rows = self.to_array(buffer).reshape(-1, width // 4)
+        digests = rows[:, 0]
+        for column in rows.T[1:]:
+            digests = pedersen_hash_many(digests, column)
+        return self.to_bytes(digests)
+
+    def hash_leaf(self, leaf):
+        return self.hash_leaves(bytes(leaf), len(leaf))
+
+    def hash_level(self, level):
+        pairs = self.to_array(level).reshape(-1, 2)
+        return self.to_bytes(pedersen_hash_many(pairs[:, 0], pairs[:, 1]))
+
+    def hash_node(self, left, right):
+        return self.hash_level(bytes(left) + bytes(right))
+
+    def padding(self, width):
+        return (P - 1).to_bytes(4, "big") * (width // 4)
+
+
+SHA256 = HashlibHasher("sha256", sha256)
+BLAKE2S = HashlibHasher("blake2s", blake2s)
+PEDERSEN = PedersenHasher()
+
+HASHERS = {hasher.name: hasher for hasher in [SHA256, BLAKE2S, PEDERSEN]}
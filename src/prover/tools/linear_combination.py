@@ -0,0 +1,71 @@
+"""
+Accumulation of random linear combinations, as used to build the composition polynomial.
+"""
+
+import numpy as np
+
+from tools.field import P, FieldElement, FieldVector
+from tools.polynomial import Polynomial
+
+
+class LinearCombination:
+    """
+    Accumulates sum(coefficient * term) in place, where the terms are either all Polynomials
+    (coefficient form) or all FieldVectors of the same length (evaluation form).
+    Every term is scaled into a reused scratch buffer and added to a single accumulator, so no
+    scaled copy nor summed copy is allocated per term.
+    """
+
+    def __init__(self, pairs=(), size=None):
+        """
+        pairs: (coefficient, term) pairs to add right away.
+        size: the number of coefficients of the result in coefficient form, if known, so that the
+        accumulator does not need to grow.
+        """
+        self.form = None
+        self.acc = None if size is None else np.zeros(size, dtype=np.uint64)
+        self.scratch = None
+        for coefficient, term in pairs:
+            self.add(coefficient, term)
+
+    def add(self, coefficient, term):
+        """
+        Adds coefficient * term to the combination.
+        """
+        if isinstance(term, Polynomial):
+            form, vals = Polynomial, term.coeffs
+        else:
+            assert isinstance(term, FieldVector), f"Cannot combine {type(term)}."
+            form, vals = FieldVector, term.vals
+        assert self.form in (None, form), "Cannot mix coefficient and evaluation forms."
+        self.form = form
+        n = len(vals)
+        if self.acc is None:
+            self.acc = np.zeros(n, dtype=np.uint64)
+        elif form is FieldVector:
+            assert n == len(self.acc), "The evaluation vectors have different lengths."
+        elif n > len(self.acc):
+            self.acc = np.concatenate(
+                (self.acc, np.zeros(n - len(self.acc), dtype=np.uint64))
+            )
+        if self.scratch is None or len(self.scratch) < n:
+            self.scratch = np.empty(len(self.acc), dtype=np.uint64)
+        scratch, acc = self.scratch[:n], self.acc[:n]
+        np.multiply(
+            vals, np.uint64(FieldElement.typecast(coefficient).val), out=scratch
+        )
+        np.remainder(scratch, P, out=scratch)
+        np.add(acc, scratch, out=acc)
+        np.remainder(acc, P, out=acc)
+        return self
+
+    def result(self):
+        """
+        Returns the combination as a Polynomial or a FieldVector, according to the form of its
+        terms. The accumulator is handed over without copying, so the combination should not be
+        added to afterwards.
+        """
+        assert self.form is not None, "The linear combination is empty."
+        if self.form is Polynomial:
+            return Polynomial._from_array(self.acc)
+        return FieldVector._wrap(self.acc)
@@ -1,63 +1,260 @@
+import mmap
+import os
 from hashlib import sha256
+from itertools import islice
 from math import log2, ceil
 
-from tools.field import FieldElement
+import numpy as np
+
+from tools.field import FieldElement, FieldVector
+from tools.hashers import SHA256
+
+
+def leaf_bytes(leaf):
+    """
+    The bytes hashed for a leaf: 4 big-endian bytes for a FieldElement (or an int), the leaf itself
+    for bytes, its utf-8 encoding for a string, and the concatenation of its elements for a row
+    (a list or tuple).
+    """
+    if isinstance(leaf, (list, tuple)):
+        return b''.join(map(leaf_bytes, leaf))
+    if isinstance(leaf, bytes):
+        return leaf
+    if isinstance(leaf, str):
+        return leaf.encode()
+    return FieldElement.typecast(leaf).val.to_bytes(4, 'big')
+
+
+def hash_leaf(leaf, hasher=SHA256, compatible=False):
+    """
+    The digest of a leaf, as bytes, or as a hex string in the compatible mode.
+    """
+    if compatible:
+        return sha256(str(leaf).encode()).hexdigest()
+    return hasher.hash_leaf(leaf_bytes(leaf))
+
+
+def hash_node(left, right, hasher=SHA256, compatible=False):
+    """
+    The digest of an inner node from the digests of its children.
+    """
+    if compatible:
+        return sha256((left + right).encode()).hexdigest()
+    return hasher.hash_node(left, right)
+
+
+def leaf_width(data):
+    """
+    The number of field elements in each leaf of data: the number of columns of a 2-dimensional
+    array, the length of the rows of a list of rows, and 1 otherwise.
+    """
+    if isinstance(data, np.ndarray) and data.ndim == 2:
+        return data.shape[1]
+    if isinstance(data, list) and isinstance(data[0], (list, tuple)):
+        return len(data[0])
+    return 1
 
 
 class MerkleTree(object):
     """
-    A simple and naive implementation of an immutable Merkle tree.
+    An immutable Merkle tree over a list of leaves, padded with zeros to a power of two. The leaves
+    can also be given as a FieldVector, or as a 2-dimensional uint64 array of field elements whose
+    rows are the leaves, such as the rows of several columns committed together.
+    The tree is stored as one flat buffer of digests per level, from the leaves to the root, and
+    the authentication path of a leaf is read by index arithmetic.
+    The digests are given by the hasher (see tools.hashers), sha256 by default, of the leaf bytes
+    for the leaves, and of the two children digests for the inner nodes, and the root and
+    authentication paths are bytes. leaf_width is the number of field elements of a leaf, above 1
+    for leaves that are rows.
+    With compatible set, the tree instead hashes with sha256 the string of each leaf and the
+    concatenation of the hex digests of the children, which is how the tree was originally built,
+    and its root and paths are hex strings.
     """
 
-    def __init__(self, data):
-        assert isinstance(data, list)
+    def __init__(self, data, compatible=False, hasher=SHA256):
+        assert isinstance(data, (list, FieldVector, np.ndarray))
         assert len(data) > 0, 'Cannot construct an empty Merkle Tree.'
         num_leaves = 2 ** ceil(log2(len(data)))
-        self.data = data + [FieldElement(0)] * (num_leaves - len(data))
+        self.data = data
+        self.leaf_width = leaf_width(data)
         self.height = int(log2(num_leaves))
-        self.facts = {}
-        self.root = self.build_tree()
+        self.compatible = compatible
+        self.hasher = SHA256 if compatible else hasher
+        self.digest_size = self.hasher.digest_size
+        self.levels = [self.hash_leaves(num_leaves)]
+        while len(self.levels[-1]) > self.digest_size:
+            self.levels.append(self.hash_level(self.levels[-1]))
+        self.root = self.digest(self.height, 0)
+
+    def hash_leaves(self, num_leaves):
+        padding = num_leaves - len(self.data)
+        if self.compatible:
+            leaves = [str(self.get_leaf(i)).encode() for i in range(len(self.data))]
+            leaves += [b'0'] * padding
+            return b''.join(sha256(leaf).digest() for leaf in leaves)
+        if isinstance(self.data, (FieldVector, np.ndarray)):
+            vals = self.data.vals if isinstance(self.data, FieldVector) else self.data
+            width = 4 * (vals.shape[1] if vals.ndim == 2 else 1)
+            buffer = vals.astype('>u4').tobytes() + self.hasher.padding(width) * padding
+            return self.hasher.hash_leaves(buffer, width)
+        leaves = [leaf_bytes(leaf) for leaf in self.data]
+        leaves += [self.hasher.padding(len(leaves[0]))] * padding
+        return b''.join(map(self.hasher.hash_leaf, leaves))
+
+    def get_leaf(self, leaf_id):
+        """
+        Returns a leaf, as a tuple of FieldElements for a row of a 2-dimensional array.
+        """
+        if isinstance(self.data, np.ndarray):
+            return tuple(FieldElement(val) for val in self.data[leaf_id].tolist())
+        return self.data[leaf_id]
+
+    def hash_level(self, level):
+        """
+        Returns the buffer of the level above the given one.
+        """
+        if self.compatible:
+            view = memoryview(level)
+            return b''.join(
+                sha256((view[i:i + 32].hex() + view[i + 32:i + 64].hex()).encode()).digest()
+                for i in range(0, len(level), 64))
+        return self.hasher.hash_level(level)
+
+    def digest(self, level_id, node_id):
+        """
+        Returns the digest of a node, given by its level (0 for the leaves) and its index in it.
+        """
+        size = self.digest_size
+        digest = self.levels[level_id][node_id * size:(node_id + 1) * size]
+        return digest.hex() if self.compatible else digest
 
     def get_authentication_path(self, leaf_id):
-        assert 0 <= leaf_id < len(self.data)
-        node_id = leaf_id + len(self.data)
-        cur = self.root
+        """
+        Returns the siblings of the nodes on the path from the leaf to the root, starting from the
+        one under the root.
+        """
+        assert 0 <= leaf_id < 2 ** self.height
         decommitment = []
-        # In a Merkle Tree, the path from the root to a leaf, corresponds to the the leaf id's
-        # binary representation, starting from the second-MSB, where '0' means 'left', and '1' means
-        # 'right'.
-        # We therefore iterate over the bits of the binary representation - skipping the '0b'
-        # prefix, as well as the MSB.
-        for bit in bin(node_id)[3:]:
-            cur, auth = self.facts[cur]
-            if bit == '1':
-                auth, cur = cur, auth
-            decommitment.append(auth)
-        return decommitment
-
-    def build_tree(self):
-        return self.recursive_build_tree(1)
-
-    def recursive_build_tree(self, node_id):
-        if node_id >= len(self.data):
-            # A leaf.
-            id_in_data = node_id - len(self.data)
-            leaf_data = str(self.data[id_in_data])
-            h = sha256(leaf_data.encode()).hexdigest()
-            self.facts[h] = leaf_data
-            return h
-        else:
-            # An internal node.
-            left = self.recursive_build_tree(node_id * 2)
-            right = self.recursive_build_tree(node_id * 2 + 1)
-            h = sha256((left + right).encode()).hexdigest()
-            self.facts[h] = (left, right)
-            return h
+        for level_id in range(self.height):
+            decommitment.append(self.digest(level_id, leaf_id ^ 1))
+            leaf_id >>= 1
+        return decommitment[::-1]
 
+    def get_multiproof(self, leaf_ids):
+        """
+        Returns the authentication of several leaves at once: for each level from the leaves up,
+        the digests of the siblings of the nodes on the paths of the leaves, sorted by index. A
+        sibling which is itself on a path is computed by the verifier and left out, so that every
+        digest is sent at most once.
+        """
+        node_ids = sorted(set(leaf_ids))
+        assert all(0 <= leaf_id < 2 ** self.height for leaf_id in node_ids)
+        proof = []
+        for level_id in range(self.height):
+            siblings = sorted(set(node_id ^ 1 for node_id in node_ids) - set(node_ids))
+            proof.append([self.digest(level_id, node_id) for node_id in siblings])
+            node_ids = sorted(set(node_id >> 1 for node_id in node_ids))
+        return proof
 
-def verify_decommitment(leaf_id, leaf_data, decommitment, root):
+
+STREAMING_CHUNK_SIZE = 2 ** 16
+
+
+def leaf_chunks(leaves, width=1, chunk_size=STREAMING_CHUNK_SIZE):
+    """
+    Yields the leaves as uint64 arrays of at most chunk_size rows of width field elements.
+    The leaves are an iterable of FieldElements or ints (or of rows of width of them when width is
+    above 1), or a file of fixed-width field elements: a file name for 4 big-endian bytes per
+    element, or a numpy memmap (possibly sliced or shaped), whose chunks are sliced from it, so
+    that they are only paged in when read.
+    """
+    if isinstance(leaves, (str, os.PathLike)):
+        if os.path.getsize(leaves) == 0:
+            # an empty file cannot be mapped
+            return
+        leaves = np.memmap(leaves, dtype='>u4', mode='r')
+    if isinstance(leaves, np.memmap):
+        leaves = leaves.reshape(-1, width)
+        for start in range(0, len(leaves), chunk_size):
+            yield np.asarray(leaves[start:start + chunk_size], dtype=np.uint64)
+        return
+    iterator = iter(leaves)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        if width > 1:
+            chunk = [value for row in chunk for value in row]
+        vals = [FieldElement.typecast(value).val for value in chunk]
+        yield np.array(vals, dtype=np.uint64).reshape(-1, width)
+
+
+class StreamingMerkleTree(MerkleTree):
+    """
+    A MerkleTree built out of core: the leaves are streamed by chunks (see leaf_chunks), and the
+    levels are hashed chunk by chunk into a node file, so that the memory used does not depend on
+    the number of leaves. The levels are stored one after the other in the file, from the leaves
+    to the root, and the authentication paths are read from a memory map of it.
+    Its digests are those of a MerkleTree of the same leaves and hasher.
+    """
+
+    def __init__(self, leaves, path, width=1, hasher=SHA256, chunk_size=STREAMING_CHUNK_SIZE):
+        self.data = None
+        self.leaf_width = width
+        self.compatible = False
+        self.hasher = hasher
+        self.digest_size = hasher.digest_size
+        self.path = path
+        self.file = open(path, 'w+b')
+        num_data = 0
+        for chunk in leaf_chunks(leaves, width, chunk_size):
+            self.file.write(hasher.hash_leaves(chunk.astype('>u4').tobytes(), 4 * width))
+            num_data += len(chunk)
+        assert num_data > 0, 'Cannot construct an empty Merkle Tree.'
+        num_leaves = 2 ** ceil(log2(num_data))
+        self.height = int(log2(num_leaves))
+        padding = hasher.hash_leaf(hasher.padding(4 * width))
+        for start in range(num_data, num_leaves, chunk_size):
+            self.file.write(padding * min(chunk_size, num_leaves - start))
+
+        # the offset of each level in the file
+        self.offsets = [0]
+        size = num_leaves * self.digest_size
+        while size > self.digest_size:
+            self.offsets.append(self.offsets[-1] + size)
+            for start in range(0, size, 2 * chunk_size * self.digest_size):
+                self.file.seek(self.offsets[-2] + start)
+                level = self.file.read(min(2 * chunk_size * self.digest_size, size - start))
+                self.file.seek(0, os.SEEK_END)
+                self.file.write(hasher.hash_level(level))
+            size //= 2
+        self.file.flush()
+        self.nodes = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.root = self.digest(self.height, 0)
+
+    def digest(self, level_id, node_id):
+        start = self.offsets[level_id] + node_id * self.digest_size
+        return self.nodes[start:start + self.digest_size]
+
+    def close(self):
+        self.nodes.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def verify_decommitment(leaf_id, leaf_data, decommitment, root, hasher=SHA256):
     leaf_num = 2 ** len(decommitment)
     node_id = leaf_id + leaf_num
+    if isinstance(root, bytes):
+        cur = hash_leaf(leaf_data, hasher)
+        for bit, auth in zip(bin(node_id)[3:][::-1], decommitment[::-1]):
+            cur = hasher.hash_node(cur, auth) if bit == '0' else hasher.hash_node(auth, cur)
+        return cur == root
     cur = sha256(str(leaf_data).encode()).hexdigest()
     for bit, auth in zip(bin(node_id)[3:][::-1], decommitment[::-1]):
         if bit == '0':
@@ -65,4 +262,23 @@ def verify_decommitment(leaf_id, leaf_data, decommitment, root):
         else:
             h = auth + cur
         cur = sha256(h.encode()).hexdigest()
-    return cur == root
\ No newline at end of file
+    return cur == root
+
+
+def verify_multiproof(root, leaves, proof, hasher=SHA256):
+    """
+    Checks a proof of MerkleTree.get_multiproof against the root, for leaves given as a dict from
+    leaf index to leaf data.
+    """
+    compatible = isinstance(root, str)
+    nodes = {leaf_id: hash_leaf(leaf, hasher, compatible) for leaf_id, leaf in leaves.items()}
+    if not nodes or any(not 0 <= leaf_id < 2 ** len(proof) for leaf_id in nodes):
+        return False
+    for digests in proof:
+        siblings = sorted(set(node_id ^ 1 for node_id in nodes) - set(nodes))
+        if len(siblings) != len(digests):
+            return False
+        nodes.update(zip(siblings, digests))
+        nodes = {node_id >> 1: hash_node(nodes[node_id], nodes[node_id + 1], hasher, compatible)
+                 for node_id in nodes if node_id % 2 == 0}
+    return nodes == {0: root}
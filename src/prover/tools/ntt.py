@@ -0,0 +1,143 @@
+"""
+Number theoretic transforms over the field, to go from the coefficients of a polynomial to its
+evaluations over a multiplicative subgroup of power-of-two order, and back.
+The transforms work on the last axis of numpy arrays, so a whole batch of columns is transformed
+with the same number of vectorized operations as a single one.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from tools.field import P, FieldElement, FieldVector
+
+
+def is_power_of_two(n):
+    return n > 0 and n & (n - 1) == 0
+
+
+def root_of_unity(n):
+    """
+    Returns the generator of the subgroup of order n, for n a power of two dividing P - 1.
+    """
+    assert is_power_of_two(n) and (P - 1) % n == 0, f"No subgroup of order {n}."
+    return FieldElement.generator() ** ((P - 1) // n)
+
+
+@lru_cache(maxsize=None)
+def bit_reverse_permutation(n):
+    log_n = n.bit_length() - 1
+    indices = np.arange(n)
+    reversed_indices = np.zeros(n, dtype=np.int64)
+    for _ in range(log_n):
+        reversed_indices = (reversed_indices << 1) | (indices & 1)
+        indices >>= 1
+    return reversed_indices
+
+
+@lru_cache(maxsize=64)
+def twiddle_table(n, root_val):
+    """
+    Returns [root**i for i in range(n // 2)] as a uint64 array, for a root of order n given by its
+    value. The twiddles of every stage of a size n transform are a stride of this table.
+    """
+    return FieldVector.powers(FieldElement(root_val), n // 2).vals
+
+
+def ntt_array(vals, root):
+    """
+    Evaluates the polynomials whose coefficients are on the last axis of the uint64 array `vals`
+    at [root**i for i in range(n)], with an iterative radix-2 transform.
+    """
+    n = vals.shape[-1]
+    assert is_power_of_two(n), "The transform size must be a power of two."
+    root = FieldElement.typecast(root)
+    assert root**n == 1, "The root is not of the transform order."
+    batch_shape = vals.shape[:-1]
+    res = vals[..., bit_reverse_permutation(n)]
+    length = 2
+    while length <= n:
+        half = length // 2
+        twiddles = twiddle_table(n, root.val)[:: n // length]
+        blocks = res.reshape(batch_shape + (n // length, length))
+        even = blocks[..., :half]
+        odd = (blocks[..., half:] * twiddles) % P
+        res = np.concatenate(
+            ((even + odd) % P, (even + (np.uint64(P) - odd)) % P), axis=-1
+        )
+        length *= 2
+    return res.reshape(batch_shape + (n,))
+
+
+def intt_array(vals, root):
+    """
+    Inverse of ntt_array: returns the coefficients of the polynomials evaluating to `vals` at
+    [root**i for i in range(n)].
+    """
+    n = vals.shape[-1]
+    res = ntt_array(vals, FieldElement.typecast(root).inverse())
+    return (res * np.uint64(FieldElement(n).inverse().val)) % P
+
+
+def ntt(values, root):
+    """
+    Evaluates the polynomial with the given coefficients at [root**i for i in range(n)].
+    """
+    return FieldVector._wrap(ntt_array(FieldVector(values).vals, root))
+
+
+def intt(values, root):
+    """
+    Returns the coefficients of the polynomial of degree < n evaluating to `values` at
+    [root**i for i in range(n)].
+    """
+    return FieldVector._wrap(intt_array(FieldVector(values).vals, root))
+
+
+def lde(coefficients, coset_offset, blowup, trace_length=None):
+    """
+    Low degree extension: evaluates a polynomial of degree < trace_length, given by its
+    coefficients, over coset_offset * H where H is the subgroup of order trace_length * blowup.
+    The result is ordered as [coset_offset * w**i for i in range(len(H))] for
+    w = root_of_unity(len(H)).
+    trace_length defaults to the number of coefficients, rounded up to a power of two.
+    `coefficients` may also be a list of coefficient lists, in which case all of them are extended
+    in one batched transform and a list of FieldVectors is returned.
+    """
+    assert is_power_of_two(blowup), "The blowup factor must be a power of two."
+    batched = len(coefficients) > 0 and isinstance(
+        coefficients[0], (list, tuple, FieldVector, np.ndarray)
+    )
+    columns = coefficients if batched else [coefficients]
+    if trace_length is None:
+        trace_length = max([len(column) for column in columns] + [1])
+    size = (1 << (trace_length - 1).bit_length()) * blowup
+    vals = np.zeros((len(columns), size), dtype=np.uint64)
+    for i, column in enumerate(columns):
+        assert len(column) <= size, "The polynomial degree exceeds the trace length."
+        vals[i, : len(column)] = FieldVector(column).vals
+    # p(offset * x) has coefficients offset**i times those of p.
+    vals = (vals * FieldVector.powers(coset_offset, size).vals) % P
+    res = [FieldVector._wrap(row) for row in ntt_array(vals, root_of_unity(size))]
+    return res if batched else res[0]
+
+
+def coset_parameters(x_values):
+    """
+    Returns (offset, root) if x_values is [offset * root**i for i in range(n)] with root of order n,
+    a power of two. Otherwise returns None. The x_values may be FieldElements or ints, which are
+    converted to field elements first, so that root is a field division.
+    """
+    n = len(x_values)
+    if not is_power_of_two(n) or n < 2:
+        return None
+    x_values = FieldVector(x_values)
+    offset = x_values[0]
+    if offset == 0:
+        return None
+    root = x_values[1] / offset
+    if root**n != 1 or root ** (n // 2) == 1:
+        return None
+    if x_values != FieldVector.powers(root, n, offset):
+        return None
+    return offset, root
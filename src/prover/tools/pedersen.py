@@ -1,5 +1,7 @@
 # My naive implementation of starkware pedersen hash, described here: https://docs.starkware.co/starkex/pedersen-hash-function.html
-from tools.field import FieldElement
+import numpy as np
+
+from tools.field import P, FieldElement, FieldVector
 from tools.curve import Curve, CurvePoint
 
 P0 = CurvePoint(
@@ -67,6 +69,90 @@ def pedersen_hash(a: FieldElement, b: FieldElement):
     return stark_curve.add(stark_curve.add(P0, a_part), b_part).x
 
 
+def _add_many(x1, y1, x2, y2, denominator_inv):
+    """
+    Curve.add of the points (x1, y1) and (x2, y2), as uint64 arrays, given the inverses of
+    x2 - x1.
+    """
+    coef = (y2 + P - y1) % P * denominator_inv % P
+    x = (coef * coef % P + 2 * P - x1 - x2) % P
+    y = (coef * ((x1 + P - x) % P) % P + P - y1) % P
+    return x, y
+
+
+def _double_many(x1, y1, denominator_inv, alpha):
+    """
+    Curve.double of the points (x1, y1), as uint64 arrays, given the inverses of 2 * y1.
+    """
+    coef = (3 * (x1 * x1 % P) % P + alpha) % P * denominator_inv % P
+    x = (coef * coef % P + 2 * P - 2 * x1) % P
+    y = (coef * ((x1 + P - x) % P) % P + P - y1) % P
+    return x, y
+
+
+def mul_many(curve: Curve, ks, xs, ys):
+    """
+    Runs the Montgomery ladders of Curve.mul for the scalars ks and the points (xs, ys), as uint64
+    arrays, in lockstep: every step of all the ladders needs a single batch inversion.
+    Returns the coordinates of the results, and whether each one is O (for a zero scalar), in
+    which case its coordinates are meaningless.
+    """
+    alpha = np.uint64(curve.alpha.val)
+    lengths = sum(((ks >> np.uint64(i)) > 0).astype(np.int64) for i in range(64))
+    is_zero = lengths == 0
+    # the first bit of a ladder takes O, p to p, 2p
+    r0x, r0y = xs.copy(), ys.copy()
+    r0x[is_zero], r0y[is_zero] = 0, 1
+    r1x, r1y = _double_many(
+        r0x, r0y, FieldVector._wrap(2 * r0y % P).inverse().vals, alpha
+    )
+    for position in range(int(lengths.max(initial=0)) - 2, -1, -1):
+        lanes = np.nonzero(lengths - 1 > position)[0]
+        bits = ((ks[lanes] >> np.uint64(position)) & np.uint64(1)).astype(bool)
+        x0, y0, x1, y1 = r0x[lanes], r0y[lanes], r1x[lanes], r1y[lanes]
+        to_double_x, to_double_y = np.where(bits, x1, x0), np.where(bits, y1, y0)
+        inverses = FieldVector._wrap(
+            np.concatenate([(x1 + P - x0) % P, 2 * to_double_y % P])
+        ).inverse()
+        added = _add_many(x0, y0, x1, y1, inverses.vals[: len(lanes)])
+        doubled = _double_many(
+            to_double_x, to_double_y, inverses.vals[len(lanes) :], alpha
+        )
+        r0x[lanes] = np.where(bits, added[0], doubled[0])
+        r0y[lanes] = np.where(bits, added[1], doubled[1])
+        r1x[lanes] = np.where(bits, doubled[0], added[0])
+        r1y[lanes] = np.where(bits, doubled[1], added[1])
+    return r0x, r0y, is_zero
+
+
+def pedersen_hash_many(a, b):
+    """
+    Computes pedersen_hash(a[i], b[i]) for the field elements of the uint64 arrays a and b, and
+    returns their values as a uint64 array.
+    The elements are below 2**248, so their high parts are zero, and the hash of each pair is the x
+    coordinate of P0 + a * P1 + b * P3. The ladders of all the pairs run together. A zero element
+    adds O, where pedersen_hash fails to add O to O.
+    """
+    a, b = np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64)
+    n = len(a)
+    x, y, is_o = mul_many(
+        stark_curve,
+        np.concatenate([a, b]),
+        np.repeat(np.array([P1.x.val, P3.x.val], dtype=np.uint64), n),
+        np.repeat(np.array([P1.y.val, P3.y.val], dtype=np.uint64), n),
+    )
+    res_x = np.full(n, P0.x.val, dtype=np.uint64)
+    res_y = np.full(n, P0.y.val, dtype=np.uint64)
+    for part in [slice(0, n), slice(n, 2 * n)]:
+        lanes = np.nonzero(~is_o[part])[0]
+        part_x, part_y = x[part][lanes], y[part][lanes]
+        inverses = FieldVector._wrap((part_x + P - res_x[lanes]) % P).inverse().vals
+        res_x[lanes], res_y[lanes] = _add_many(
+            res_x[lanes], res_y[lanes], part_x, part_y, inverses
+        )
+    return res_x
+
+
 def trace_pedersen_hash(trace: list):
 
     a = trace[-2]
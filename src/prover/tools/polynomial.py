@@ -20,28 +20,209 @@ A polynomial interface with the functionality required for STARK101.
 """
 
 import operator
-from functools import reduce
-from tools.field import FieldElement
-from tools.list_utils import remove_trailing_elements, scalar_operation, two_lists_tuple_operation
+from functools import lru_cache
+from math import gcd
 
+import numpy as np
 
-def trim_trailing_zeros(p):
+from tools.domain import Domain
+from tools.field import FieldElement, FieldVector
+from tools.list_utils import two_lists_tuple_operation
+from tools.ntt import coset_parameters, intt_array, ntt_array, root_of_unity
+
+# Number of coefficients of the smaller operand from which Polynomial.__mul__ switches to Karatsuba,
+# then to NTT convolution. See `python bench.py mul` for the measurements behind them: the NTT
+# overtakes Karatsuba between 48 and 56 coefficients.
+KARATSUBA_THRESHOLD = 32
+NTT_MUL_THRESHOLD = 56
+# Number of points from which Polynomial.eval_many switches from vectorized Horner evaluation to
+# a remainder tree, for points that do not form a coset. See `python bench.py eval`: the two are
+# within noise of each other at 2**15 points, and the remainder tree is twice as fast at 2**16 and
+# four times as fast at 2**17.
+SUBPRODUCT_TREE_THRESHOLD = 2**16
+
+
+def mul_schoolbook(pol1, pol2):
+    """
+    Multiplies two polynomials given as lists of ints, with the quadratic schoolbook algorithm.
+    """
+    if not pol1 or not pol2:
+        return []
+    res = [0] * (len(pol1) + len(pol2) - 1)
+    for i, c1 in enumerate(pol1):
+        for j, c2 in enumerate(pol2):
+            res[i + j] += c1 * c2
+    return [x % FieldElement.k_modulus for x in res]
+
+
+def mul_karatsuba(pol1, pol2):
+    """
+    Multiplies two polynomials given as lists of ints, with Karatsuba's algorithm down to
+    KARATSUBA_THRESHOLD coefficients.
+    """
+    if min(len(pol1), len(pol2)) <= KARATSUBA_THRESHOLD:
+        return mul_schoolbook(pol1, pol2)
+    if len(pol1) < len(pol2):
+        pol1, pol2 = pol2, pol1
+    half = len(pol1) // 2
+    low1, high1 = pol1[:half], pol1[half:]
+    res = [0] * (len(pol1) + len(pol2) - 1)
+    if len(pol2) <= half:
+        # Unbalanced operands: only the longest one is split.
+        for i, c in enumerate(mul_karatsuba(low1, pol2)):
+            res[i] += c
+        for i, c in enumerate(mul_karatsuba(high1, pol2), half):
+            res[i] += c
+        return [x % FieldElement.k_modulus for x in res]
+    low2, high2 = pol2[:half], pol2[half:]
+    low = mul_karatsuba(low1, low2)
+    high = mul_karatsuba(high1, high2)
+    middle = mul_karatsuba(
+        two_lists_tuple_operation(low1, high1, operator.add, 0),
+        two_lists_tuple_operation(low2, high2, operator.add, 0),
+    )
+    # (low1 + x^half high1)(low2 + x^half high2)
+    # = low + x^half (middle - low - high) + x^(2 half) high
+    for i, c in enumerate(low):
+        res[i] += c
+        res[i + half] -= c
+    for i, c in enumerate(high):
+        res[i + 2 * half] += c
+        res[i + half] -= c
+    for i, c in enumerate(middle):
+        res[i + half] += c
+    return [x % FieldElement.k_modulus for x in res]
+
+
+def mul_ntt(pol1, pol2):
+    """
+    Multiplies two polynomials given as uint64 arrays (or lists of ints), as a pointwise product of
+    their NTTs, and returns the product as a uint64 array.
+    """
+    if not len(pol1) or not len(pol2):
+        return np.zeros(0, dtype=np.uint64)
+    res_len = len(pol1) + len(pol2) - 1
+    size = 1 << (res_len - 1).bit_length()
+    vals = np.zeros((2, size), dtype=np.uint64)
+    vals[0, : len(pol1)] = pol1
+    vals[1, : len(pol2)] = pol2
+    root = root_of_unity(size)
+    evaluations = ntt_array(vals, root)
+    res = intt_array((evaluations[0] * evaluations[1]) % FieldElement.k_modulus, root)
+    return res[:res_len]
+
+
+def mul_coefficients(pol1, pol2):
     """
-    Removes zeros from the end of a list.
+    Multiplies two polynomials given as uint64 arrays (or lists of ints), choosing the algorithm
+    from the size of the smaller operand, and returns the product as a uint64 array. Only the small
+    operands of the schoolbook and Karatsuba algorithms are converted to lists.
     """
-    return remove_trailing_elements(p, FieldElement.zero())
+    size = min(len(pol1), len(pol2))
+    if size >= NTT_MUL_THRESHOLD:
+        return mul_ntt(pol1, pol2)
+    pol1 = np.asarray(pol1, dtype=np.uint64).tolist()
+    pol2 = np.asarray(pol2, dtype=np.uint64).tolist()
+    if size <= KARATSUBA_THRESHOLD:
+        return np.array(mul_schoolbook(pol1, pol2), dtype=np.uint64)
+    return np.array(mul_karatsuba(pol1, pol2), dtype=np.uint64)
 
 
-def prod(values):
+def inverse_series(pol, k):
     """
-    Computes a product.
+    Returns the k first coefficients of the power series inverse of pol, i.e. g such that
+    pol * g = 1 mod x**k, using Newton iteration. pol is a uint64 array with pol[0] != 0.
     """
-    len_values = len(values)
-    if len_values == 0:
-        return 1
-    if len_values == 1:
-        return values[0]
-    return prod(values[:len_values // 2]) * prod(values[len_values // 2:])
+    k_modulus = FieldElement.k_modulus
+    res = np.array([FieldElement(int(pol[0])).inverse().val], dtype=np.uint64)
+    precision = 1
+    while precision < k:
+        precision = min(2 * precision, k)
+        # res = res * (2 - pol * res) mod x**precision
+        error = (k_modulus - mul_coefficients(pol[:precision], res)[:precision]) % k_modulus
+        error[0] = (error[0] + 2) % k_modulus
+        res = mul_coefficients(res, error)[:precision]
+    return res
+
+
+def divmod_coefficients(pol1, pol2):
+    """
+    Returns the quotient and remainder of the division of pol1 by pol2, given as uint64 arrays
+    without trailing zeros, with a Newton inversion of reversed pol2, so it runs in the time of a
+    few multiplications.
+    """
+    k_modulus = FieldElement.k_modulus
+    if len(pol1) < len(pol2):
+        return np.zeros(0, dtype=np.uint64), pol1
+    k = len(pol1) - len(pol2) + 1
+    # reversed(pol1) = reversed(quotient) * reversed(pol2) mod x**k
+    reversed_quotient = mul_coefficients(pol1[::-1][:k], inverse_series(pol2[::-1], k))[:k]
+    quotient = reversed_quotient[::-1]
+    product = mul_coefficients(pol2, quotient)
+    n = len(pol2) - 1
+    remainder = (pol1[:n] + k_modulus - product[:n]) % k_modulus
+    return quotient, trim_trailing_zeros_array(remainder)
+
+
+def eval_horner_many(pol, points):
+    """
+    Evaluates the polynomial given as a uint64 array at all the points of the uint64 array points,
+    with one vectorized Horner pass.
+    """
+    k_modulus = FieldElement.k_modulus
+    res = np.zeros(len(points), dtype=np.uint64)
+    for coef in reversed(pol):
+        res = (res * points + np.uint64(coef)) % k_modulus
+    return res
+
+
+def eval_remainder_tree(pol, points, leaf_size=64):
+    """
+    Evaluates the polynomial given as a uint64 array at all the points of the list of ints points:
+    the polynomial is reduced modulo the products of (x - point) down a subproduct tree, and the
+    remainders at blocks of leaf_size points are evaluated with vectorized Horner passes.
+    """
+    k_modulus = FieldElement.k_modulus
+    # tree[k][j] is the product of (x - point) for the points of the j-th block of 2**k points.
+    tree = [[np.array([(-x) % k_modulus, 1], dtype=np.uint64) for x in points]]
+    while len(tree[-1]) > 1:
+        level = tree[-1]
+        tree.append([mul_coefficients(level[j], level[j + 1]) if j + 1 < len(level) else level[j]
+                     for j in range(0, len(level), 2)])
+    depth = len(tree) - 1
+    remainders = [divmod_coefficients(pol, tree[depth][0])[1]]
+    while 2**depth > leaf_size:
+        depth -= 1
+        remainders = [divmod_coefficients(remainders[j // 2], node)[1]
+                      for j, node in enumerate(tree[depth])]
+    block = 2**depth
+    points = np.array(points, dtype=np.uint64)
+    return np.concatenate([eval_horner_many(remainder, points[j * block:(j + 1) * block])
+                           for j, remainder in enumerate(remainders)])
+
+
+def eval_coset(pol, offset, root, n):
+    """
+    Evaluates the polynomial given as a uint64 array over [offset * root**i for i in range(n)],
+    where root is of order n, with a forward NTT.
+    """
+    k_modulus = FieldElement.k_modulus
+    # p(offset * y) on the subgroup, where y**n = 1: coefficient i is offset**i times the one of p,
+    # and is added to the coefficient i mod n.
+    scaled = (pol * FieldVector.powers(offset, len(pol)).vals) % k_modulus
+    folded = np.zeros(n, dtype=np.uint64)
+    for start in range(0, len(pol), n):
+        block = scaled[start:start + n]
+        folded[:len(block)] = (folded[:len(block)] + block) % k_modulus
+    return ntt_array(folded, root)
+
+
+def trim_trailing_zeros_array(vals):
+    """
+    Returns the prefix of the array up to its last non-zero entry, as a view (without copying).
+    """
+    nonzero = np.flatnonzero(vals)
+    return vals[:nonzero[-1] + 1] if len(nonzero) else vals[:0]
 
 
 def latex_monomial(exponent, coef, var):
@@ -62,6 +243,8 @@ def latex_monomial(exponent, coef, var):
 class Polynomial:
     """
     Represents a polynomial over FieldElement.
+    The coefficients are stored in a contiguous uint64 array, normalized once at construction, so
+    the degree is known without scanning them.
     """
 
     @classmethod
@@ -72,11 +255,45 @@ class Polynomial:
         return cls([FieldElement.zero(), FieldElement.one()])
 
     def __init__(self, coefficients, var='x'):
-        # Internally storing the coefficients in self.poly, least-significant (i.e. free term)
-        # first, so $9 - 3x^2 + 19x^5$ is represented internally by the list  [9, 0, -3, 0, 0, 19].
+        # Internally storing the coefficients in self.coeffs, least-significant (i.e. free term)
+        # first, so $9 - 3x^2 + 19x^5$ is represented internally by the array [9, 0, -3, 0, 0, 19].
+        # coefficients may be a list of FieldElements or ints, a FieldVector or a numpy array.
         # Note that coefficients is copied, so the caller may freely modify the given argument.
-        self.poly = remove_trailing_elements(coefficients, FieldElement.zero())
+        if isinstance(coefficients, FieldVector):
+            vals = coefficients.vals.copy()
+        else:
+            vals = FieldVector(coefficients).vals
+        self._init_coeffs(vals, var)
+
+    def _init_coeffs(self, vals, var='x'):
+        self.coeffs = trim_trailing_zeros_array(vals)
         self.var = var
+        # Memoized results of scale_input, by the value of the scaling factor.
+        self._scaled_inputs = {}
+
+    @staticmethod
+    def _from_array(vals, var='x'):
+        """
+        Constructs a polynomial from a uint64 array of reduced coefficients, without copying it.
+        Used on the arrays freshly computed by the arithmetic operations.
+        """
+        res = Polynomial.__new__(Polynomial)
+        res._init_coeffs(vals, var)
+        return res
+
+    @property
+    def poly(self):
+        """
+        The coefficients as a list of FieldElements.
+        """
+        return FieldVector._wrap(self.coeffs).to_elements()
+
+    @property
+    def vector(self):
+        """
+        The coefficients as a FieldVector, sharing their storage.
+        """
+        return FieldVector._wrap(self.coeffs)
 
     def _repr_latex_(self):
         """
@@ -108,7 +325,7 @@ class Polynomial:
             other = Polynomial.typecast(other)
         except AssertionError:
             return False
-        return self.poly == other.poly
+        return np.array_equal(self.coeffs, other.coeffs)
 
     @staticmethod
     def typecast(other):
@@ -124,31 +341,28 @@ class Polynomial:
 
     def __add__(self, other):
         other = Polynomial.typecast(other)
-        return Polynomial(two_lists_tuple_operation(
-            self.poly, other.poly, operator.add, FieldElement.zero()))
+        pol1, pol2 = self.coeffs, other.coeffs
+        res = np.zeros(max(len(pol1), len(pol2)), dtype=np.uint64)
+        res[:len(pol1)] = pol1
+        res[:len(pol2)] += pol2
+        return Polynomial._from_array(res % FieldElement.k_modulus)
 
     __radd__ = __add__  # To support <int> + <Polynomial> (as in `1 + x + x**2`).
 
     def __sub__(self, other):
         other = Polynomial.typecast(other)
-        return Polynomial(two_lists_tuple_operation(
-            self.poly, other.poly, operator.sub, FieldElement.zero()))
+        return self + (-other)
 
     def __rsub__(self, other):  # To support <int> - <Polynomial> (as in `1 - x + x**2`).
         return -(self - other)
 
     def __neg__(self):
-        return Polynomial([]) - self
+        k_modulus = FieldElement.k_modulus
+        return Polynomial._from_array((np.uint64(k_modulus) - self.coeffs) % k_modulus)
 
     def __mul__(self, other):
         other = Polynomial.typecast(other)
-        pol1, pol2 = [[x.val for x in p.poly] for p in (self, other)]
-        res = [0] * (self.degree() + other.degree() + 1)
-        for i, c1 in enumerate(pol1):
-            for j, c2 in enumerate(pol2):
-                res[i + j] += c1 * c2
-        res = [FieldElement(x) for x in res]
-        return Polynomial(res)
+        return Polynomial._from_array(mul_coefficients(self.coeffs, other.coeffs))
 
     __rmul__ = __mul__  # To support <int> * <Polynomial>.
 
@@ -162,11 +376,26 @@ class Polynomial:
         True
         """
         other = Polynomial.typecast(other)
+        if other.degree() == 1 and other.coeffs[0] == 0:
+            # A monomial c * x: only the coefficients need to be scaled.
+            return self.scale_input(int(other.coeffs[1]))
         res = Polynomial([])
-        for coef in self.poly[::-1]:
+        for coef in self.coeffs[::-1].tolist():
             res = (res * other) + Polynomial([coef])
         return res
 
+    def scale_input(self, c):
+        """
+        Returns the polynomial p(c * x), whose coefficient of x**i is c**i times the one of p, in
+        linear time. The result is memoized per c, so repeated shifts of the same polynomial (as in
+        p(g * x) for a trace polynomial p) are free.
+        """
+        c = FieldElement.typecast(c)
+        if c.val not in self._scaled_inputs:
+            scaled = self.vector * FieldVector.powers(c, len(self.coeffs))
+            self._scaled_inputs[c.val] = Polynomial._from_array(scaled.vals)
+        return self._scaled_inputs[c.val]
+
     def qdiv(self, other):
         """
         Returns q, r the quotient and remainder polynomials respectively, such that
@@ -174,25 +403,19 @@ class Polynomial:
         * Assert that g is not the zero polynomial.
         """
         other = Polynomial.typecast(other)
-        pol2 = trim_trailing_zeros(other.poly)
-        assert pol2, 'Dividing by zero polynomial.'
-        pol1 = trim_trailing_zeros(self.poly)
-        rem = pol1
-        deg_dif = len(rem) - len(pol2)
-        quotient = [FieldElement.zero()] * (deg_dif + 1)
-        g_msc_inv = pol2[-1].inverse()
-        while deg_dif >= 0:
-            tmp = rem[-1] * g_msc_inv
-            quotient[deg_dif] = quotient[deg_dif] + tmp
-            last_non_zero = deg_dif - 1
-            for i, coef in enumerate(pol2, deg_dif):
-                rem[i] = rem[i] - (tmp * coef)
-                if rem[i] != FieldElement.zero():
-                    last_non_zero = i
-            # Eliminate trailing zeroes (i.e. make r end with its last non-zero coefficient).
-            rem = rem[:last_non_zero + 1]
-            deg_dif = len(rem) - len(pol2)
-        return Polynomial(trim_trailing_zeros(quotient)), Polynomial(rem)
+        k_modulus = FieldElement.k_modulus
+        pol2 = other.coeffs
+        assert len(pol2), 'Dividing by zero polynomial.'
+        rem = self.coeffs.copy()
+        quotient = np.zeros(max(len(rem) - len(pol2) + 1, 0), dtype=np.uint64)
+        g_msc_inv = np.uint64(FieldElement(int(pol2[-1])).inverse().val)
+        # Each step cancels the leading coefficient of rem with a single vectorized update.
+        for deg_dif in reversed(range(len(quotient))):
+            tmp = (rem[deg_dif + len(pol2) - 1] * g_msc_inv) % k_modulus
+            quotient[deg_dif] = tmp
+            window = rem[deg_dif:deg_dif + len(pol2)]
+            window[:] = (window + (np.uint64(k_modulus) - (tmp * pol2) % k_modulus)) % k_modulus
+        return Polynomial._from_array(quotient), Polynomial._from_array(rem[:len(pol2) - 1])
 
     def __truediv__(self, other):
         div, mod = self.qdiv(other)
@@ -207,7 +430,9 @@ class Polynomial:
         """
         Constructs the monomial coefficient * x**degree.
         """
-        return Polynomial([FieldElement.zero()] * degree + [coefficient])
+        res = np.zeros(degree + 1, dtype=np.uint64)
+        res[degree] = FieldElement.typecast(coefficient).val
+        return Polynomial._from_array(res)
 
     @staticmethod
     def gen_linear_term(point):
@@ -218,11 +443,10 @@ class Polynomial:
 
     def degree(self):
         """
-        The polynomials are represented by a list so the degree is the length of the list minus the
-        number of trailing zeros (if they exist) minus 1.
+        The coefficients are stored without trailing zeros, so the degree is their number minus 1.
         This implies that the degree of the zero polynomial will be -1.
         """
-        return len(trim_trailing_zeros(self.poly)) - 1
+        return len(self.coeffs) - 1
 
     def get_nth_degree_coefficient(self, n):
         """
@@ -231,13 +455,14 @@ class Polynomial:
         if n > self.degree():
             return FieldElement.zero()
         else:
-            return self.poly[n]
+            return FieldElement(int(self.coeffs[n]))
 
     def scalar_mul(self, scalar):
         """
         Multiplies polynomial by a scalar
         """
-        return Polynomial(scalar_operation(self.poly, operator.mul, scalar))
+        scalar = np.uint64(FieldElement.typecast(scalar).val)
+        return Polynomial._from_array((self.coeffs * scalar) % FieldElement.k_modulus)
 
     def eval(self, point):
         """
@@ -246,10 +471,33 @@ class Polynomial:
         point = FieldElement.typecast(point).val
         # Doing this with ints (as opposed to `FieldElement`s) speeds up eval significantly.
         val = 0
-        for coef in self.poly[::-1]:
-            val = (val * point + coef.val) % FieldElement.k_modulus
+        for coef in self.coeffs[::-1].tolist():
+            val = (val * point + coef) % FieldElement.k_modulus
         return FieldElement(val)
 
+    def eval_many(self, points, as_vector=False):
+        """
+        Evaluates the polynomial at all the given points, returned as a list of FieldElements, or
+        a FieldVector if as_vector is set.
+        Points forming a power-of-two subgroup (or a coset of one) in order, such as a Domain, are
+        evaluated with an NTT. Other point sets are evaluated with a vectorized Horner pass, or with
+        a remainder tree from SUBPRODUCT_TREE_THRESHOLD points.
+        """
+        pol = self.coeffs
+        if isinstance(points, Domain):
+            parameters = points.offset, points.generator
+        else:
+            parameters = coset_parameters(points)
+        if parameters is not None:
+            offset, root = parameters
+            res = eval_coset(pol, offset, root, len(points))
+        elif len(points) >= SUBPRODUCT_TREE_THRESHOLD:
+            res = eval_remainder_tree(pol, [FieldVector._to_int(x) for x in points])
+        else:
+            res = eval_horner_many(pol, FieldVector(points).vals)
+        res = FieldVector._wrap(res)
+        return res if as_vector else res.to_elements()
+
     def __call__(self, other):
         """
         If `other` is an int or a FieldElement, evaluates the polynomial on `other` (in the field).
@@ -284,48 +532,229 @@ class Polynomial:
 X = Polynomial.X()
 
 
-def calculate_lagrange_polynomials(x_values):
+def divide_by_linear(pol, root):
+    """
+    Divides the polynomial given as a list of ints by (x - root), with synthetic division.
+    Returns the quotient as a list of ints and the remainder, which is pol evaluated at root.
+    """
+    k_modulus = FieldElement.k_modulus
+    quotient = [0] * max(len(pol) - 1, 0)
+    acc = 0
+    for i in reversed(range(1, len(pol))):
+        acc = (acc * root + pol[i]) % k_modulus
+        quotient[i - 1] = acc
+    remainder = (acc * root + pol[0]) % k_modulus if pol else 0
+    return quotient, remainder
+
+
+class VanishingPolynomial(Polynomial):
+    """
+    Represents (x**n - 1) / prod(x - r for r in excluded_roots): the polynomial vanishing on the
+    subgroup of order n, except on the excluded roots.
+    On top of the dense coefficients, this sparse form is used to evaluate it in O(log n) at a
+    point, in O(log n) vectorized passes at many points and in O(n) over a coset, and to divide
+    dense polynomials by it in linear time.
+    """
+
+    def __init__(self, n, excluded_roots=(), var='x'):
+        self.n = n
+        self.excluded_roots = [FieldElement.typecast(r) for r in excluded_roots]
+        k_modulus = FieldElement.k_modulus
+        coefficients = [k_modulus - 1] + [0] * (n - 1) + [1]
+        for root in self.excluded_roots:
+            coefficients, remainder = divide_by_linear(coefficients, root.val)
+            assert remainder == 0, f'{root} is not a root of x**{n} - 1.'
+        super().__init__(coefficients, var)
+
+    def eval(self, point):
+        point = FieldElement.typecast(point)
+        denominator = FieldElement.one()
+        for root in self.excluded_roots:
+            denominator *= point - root
+        if denominator == 0:
+            # The point is one of the excluded roots, where the sparse form is 0 / 0.
+            return super().eval(point)
+        return (point ** self.n - 1) / denominator
+
+    def eval_many(self, points, as_vector=False):
+        """
+        Evaluates the polynomial at all the given points, as Polynomial.eval_many does, from the
+        sparse form: (x**n - 1) / prod(x - r) over the vector of the points, with a single batch
+        inversion. The excluded roots, where this is 0 / 0, are evaluated with the dense
+        coefficients.
+        """
+        x_values = points.vector if isinstance(points, Domain) else FieldVector(points)
+        denominator = FieldVector.ones(len(x_values))
+        for root in self.excluded_roots:
+            denominator *= x_values - root
+        res = (x_values ** self.n - 1) * denominator.inverse(allow_zero=True)
+        excluded = np.flatnonzero(denominator.vals == 0)
+        if len(excluded):
+            res.vals[excluded] = super().eval_many(x_values[excluded], as_vector=True).vals
+        return res if as_vector else res.to_elements()
+
+    def _coset_numerator_inverses(self, offset, size):
+        """
+        Returns the inverses of x**n - 1 over the coset offset * <root_of_unity(size)>.
+        x**n only takes size / gcd(size, n) values there, so only those are inverted.
+        """
+        offset = FieldElement.typecast(offset)
+        period = size // gcd(size, self.n)
+        numerator = FieldVector.powers(root_of_unity(size) ** self.n, period, offset ** self.n) - 1
+        assert numerator.vals.all(), 'The coset intersects the vanishing subgroup.'
+        return FieldVector._wrap(np.tile(numerator.inverse().vals, size // period))
+
+    def _coset_excluded_factors(self, offset, size):
+        """
+        Returns prod(x - r for r in excluded_roots) over the coset offset * <root_of_unity(size)>.
+        """
+        x_values = FieldVector.powers(root_of_unity(size), size, offset)
+        res = FieldVector.ones(size)
+        for root in self.excluded_roots:
+            res *= x_values - root
+        return res
+
+    def coset_evaluations(self, offset, size):
+        """
+        Evaluates the polynomial over the coset offset * <root_of_unity(size)>, ordered as in
+        tools.ntt.lde.
+        """
+        return 1 / (self._coset_numerator_inverses(offset, size) *
+                    self._coset_excluded_factors(offset, size))
+
+    def coset_inverse_evaluations(self, offset, size):
+        """
+        Evaluates 1 / self over the coset offset * <root_of_unity(size)>, ordered as in
+        tools.ntt.lde. This is what pointwise divisions by the polynomial multiply with.
+        """
+        return (self._coset_numerator_inverses(offset, size) *
+                self._coset_excluded_factors(offset, size))
+
+    def __rtruediv__(self, other):
+        """
+        Divides the dense polynomial other by self, in time linear in its degree: other is multiplied
+        by the excluded (x - r) factors, then divided by x**n - 1.
+        """
+        other = Polynomial.typecast(other)
+        k_modulus = FieldElement.k_modulus
+        pol = other.coeffs.tolist()
+        for root in self.excluded_roots:
+            # pol * (x - root)
+            pol = [(a - root.val * b) % k_modulus for a, b in zip([0] + pol, pol + [0])]
+        # pol = quotient * (x**n - 1) + remainder, so from the top down,
+        # quotient[i] = pol[i + n] + quotient[i + n] and remainder[i] = pol[i] + quotient[i].
+        n = self.n
+        quotient = [0] * max(len(pol) - n, 0)
+        padded = quotient + [0] * n
+        for i in reversed(range(len(quotient))):
+            padded[i] = (pol[i + n] + padded[i + n]) % k_modulus
+        quotient = padded[:len(quotient)]
+        remainder = [(pol[i] + padded[i]) % k_modulus for i in range(min(n, len(pol)))]
+        assert not any(remainder), 'Polynomials are not divisible.'
+        return Polynomial(quotient)
+
+
+# Number of point sets whose Lagrange polynomials are kept by lagrange_basis_matrix.
+LAGRANGE_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=LAGRANGE_CACHE_SIZE)
+def lagrange_basis_matrix(x_values):
+    """
+    Returns the Lagrange polynomials of x_values, a tuple of ints, as a uint64 matrix whose row j
+    holds the coefficients of the polynomial that is 1 on x_values[j] and 0 on the other points.
+    They are computed in the barycentric form L_j = w_j * N / (x - x_j), where N = prod(x - x_i)
+    and w_j = 1 / N'(x_j), and memoized for the last LAGRANGE_CACHE_SIZE point sets.
+    """
+    assert len(set(x_values)) == len(x_values), 'The x_values are not distinct.'
+    k_modulus = FieldElement.k_modulus
+    numerator = [1]
+    for x in x_values:
+        # numerator * (x - x_value)
+        numerator = [(a - x * b) % k_modulus for a, b in zip([0] + numerator, numerator + [0])]
+    quotients = []
+    derivatives = []
+    for x in x_values:
+        quotient, _ = divide_by_linear(numerator, x)
+        quotients.append(quotient)
+        # N / (x - x_j) evaluated at x_j is N'(x_j).
+        derivatives.append(divide_by_linear(quotient, x)[1])
+    weights = FieldVector(FieldElement.batch_inverse(derivatives)).vals
+    matrix = np.array(quotients, dtype=np.uint64).reshape(len(x_values), len(x_values))
+    return (matrix * weights[:, None]) % k_modulus
+
+
+def matmul_mod(left, right):
+    """
+    Multiplies two uint64 matrices of reduced field elements, modulo P.
+    The left matrix is split into 16-bit limbs so that the products, and the sums of up to 2**15 of
+    them, do not overflow.
+    """
+    k_modulus = FieldElement.k_modulus
+    res = np.zeros((left.shape[0], right.shape[1]), dtype=np.uint64)
+    block = 2**15
+    for start in range(0, left.shape[1], block):
+        left_block = left[:, start:start + block]
+        right_block = right[start:start + block]
+        low = (left_block & np.uint64(0xFFFF)) @ right_block % k_modulus
+        high = (left_block >> np.uint64(16)) @ right_block % k_modulus
+        res = (res + low + (high << np.uint64(16)) % k_modulus) % k_modulus
+    return res
+
+
+def interpolate_poly_ntt(y_values, root, offset=FieldElement.one()):
     """
-    Given the x_values for evaluating some polynomials, it computes part of the lagrange polynomials
-    required to interpolate a polynomial over this domain.
+    :param y_values: evaluations of the polynomial at [offset * root**i for i in range(n)], where
+    root is of order n, a power of two.
+    :return: the interpolated poly, computed with an inverse NTT.
     """
-    lagrange_polynomials = []
-    monomials = [Polynomial.monomial(1, FieldElement.one()) -
-                 Polynomial.monomial(0, x) for x in x_values]
-    numerator = prod(monomials)
-    for j in range(len(x_values)):
-        # In the denominator, we have:
-        # (x_j-x_0)(x_j-x_1)...(x_j-x_{j-1})(x_j-x_{j+1})...(x_j-x_{len(X)-1})
-        denominator = prod([x_values[j] - x for i, x in enumerate(x_values) if i != j])
-        # Numerator is a bit more complicated, since we need to compute a poly multiplication here.
-        # Similarly to the denominator, we have:
-        # (x-x_0)(x-x_1)...(x-x_{j-1})(x-x_{j+1})...(x-x_{len(X)-1})
-        cur_poly, _ = numerator.qdiv(monomials[j].scalar_mul(denominator))
-        lagrange_polynomials.append(cur_poly)
-    return lagrange_polynomials
+    return interpolate_many_ntt([y_values], root, offset)[0]
 
 
-def interpolate_poly_lagrange(y_values, lagrange_polynomials):
+def interpolate_many_ntt(list_of_y_values, root, offset=FieldElement.one()):
     """
-    :param y_values: y coordinates of the points.
-    :param lagrange_polynomials: the polynomials obtained from calculate_lagrange_polynomials.
-    :return: the interpolated poly/
+    Same as interpolate_poly_ntt for several columns of evaluations, in one batched transform.
     """
-    poly = Polynomial([])
-    for j, y_value in enumerate(y_values):
-        poly += lagrange_polynomials[j].scalar_mul(y_value)
-    return poly
+    n = len(list_of_y_values[0])
+    vals = np.array([FieldVector(y_values).vals for y_values in list_of_y_values])
+    # The inverse NTT gives the coefficients of p(offset * x), which are offset**i times those of p.
+    coefficients = intt_array(vals, root) * FieldVector.powers(offset.inverse(), n).vals
+    coefficients %= FieldElement.k_modulus
+    return [Polynomial._from_array(row) for row in coefficients]
+
+
+def interpolate_many(x_values, list_of_y_values):
+    """
+    Returns, for each y_values of list_of_y_values, the polynomial of degree < len(x_values) that
+    evaluates to y_values[i] on x_values[i] for all i.
+    The setup shared by all the columns is done once: a single batched inverse NTT when x_values is
+    a power-of-two subgroup (or a coset of one) taken in order, otherwise the memoized Lagrange
+    polynomials of x_values, applied to all the columns in one matrix product.
+    """
+    assert all(len(x_values) == len(y_values) for y_values in list_of_y_values)
+    assert all(isinstance(val, FieldElement) for val in x_values),\
+        'Not all x_values are FieldElement'
+    assert all(isinstance(val, FieldElement) for y_values in list_of_y_values for val in y_values),\
+        'Not all y_values are FieldElement'
+    if not x_values or not list_of_y_values:
+        return [Polynomial([]) for _ in list_of_y_values]
+    parameters = coset_parameters(x_values)
+    if parameters is not None:
+        offset, root = parameters
+        return interpolate_many_ntt(list_of_y_values, root, offset)
+    lagrange_polynomials = lagrange_basis_matrix(tuple(x.val for x in x_values))
+    vals = np.array([FieldVector(y_values).vals for y_values in list_of_y_values])
+    coefficients = matmul_mod(vals, lagrange_polynomials)
+    return [Polynomial._from_array(row) for row in coefficients]
 
 
 def interpolate_poly(x_values, y_values):
     """
     Returns a polynomial of degree < len(x_values) that evaluates to y_values[i] on x_values[i] for
     all i.
+    When x_values is a power-of-two subgroup (or a coset of one), taken in order, the polynomial is
+    computed with an inverse NTT, otherwise with memoized Lagrange polynomials (see
+    interpolate_many).
     """
     assert len(x_values) == len(y_values)
-    assert all(isinstance(val, FieldElement) for val in x_values),\
-        'Not all x_values are FieldElement'
-    lp = calculate_lagrange_polynomials(x_values)
-    assert all(isinstance(val, FieldElement) for val in y_values),\
-        'Not all y_values are FieldElement'
-    return interpolate_poly_lagrange(y_values, lp)
+    return interpolate_many(x_values, [y_values])[0]